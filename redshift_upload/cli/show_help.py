@@ -12,7 +12,7 @@ def upload_args() -> None:
 
     cleanup_s3:
     Default: True
-    Tells the program to try to delete the file in S3 after copying to Redshift
+    Tells the program to try to delete the file in S3 after copying to Redshift. The files are deleted up to 1000 at a time. With "background", the files are deleted on a separate thread, so the upload returns as soon as the data is copied. Python still waits for those deletes before exiting
 
     grant_access:
     Default: []
@@ -32,7 +32,11 @@ def upload_args() -> None:
 
     load_in_parallel:
     Default: None
-    The number of s3 files to seperate the file into. If None, defaults to sqrt of the num_rows. See more for why we do this here: https://docs.aws.amazon.com/redshift/latest/dg/t_splitting-data-files.html
+    The number of s3 files to seperate the file into. If None, the compression ratio is measured on a sample of the source, and the file is split into about 64MB compressed files, rounded up to a multiple of node_count. See more for why we do this here: https://docs.aws.amazon.com/redshift/latest/dg/t_splitting-data-files.html
+
+    node_count:
+    Default: None
+    The number of slices in the cluster. The number of s3 files is kept a multiple of it, so every slice has the same number of files to load. If None, it's read from stv_slices (once per host)
 
     default_logging:
     Default: True
@@ -49,6 +53,66 @@ def upload_args() -> None:
     allow_alter_table
     Default: False
     If true and there are new columns in the local data, adds them to the Redshift table
+
+    columnar_inference:
+    Default: False
+    Infers the column types a whole column at a time with vectorized checks. Faster on large sources, but holds every row in memory at once, so it can't be combined with stream_from_file
+
+    infer_in_parallel:
+    Default: None
+    The number of processes to split the column type inference between. Each gets at least 16MB of the source, so small sources stay in a single process. Can't be combined with columnar_inference
+
+    infer_sample_rows:
+    Default: None
+    Infers the column types from a sample of this many rows: the first 1000 rows plus rows from random points in the source. The rest of the rows are checked as they are written to S3, and a column is widened (rewriting only the affected S3 files) if a later value doesn't fit
+
+    infer_sample_fraction:
+    Default: None
+    Like infer_sample_rows, but as a fraction of the (estimated) row count. If both are set, the larger sample is used
+
+    raw_passthrough:
+    Default: False
+    Uploads a CSV file without parsing its rows. A .csv file is split on row boundaries and the pieces are compressed as they are, while a .csv.gz or .csv.bz2 file is uploaded as it is. Requires skip_checks, so the file must already be in a format COPY accepts, with its columns in the table's order
+
+    compression:
+    Default: bzip2
+    How the chunks are compressed before they're uploaded to S3. One of bzip2, gzip, zstd, lzop, or none. bzip2 compresses the most but is by far the slowest, while zstd at a low level is much faster for a similar size. zstd needs the zstandard package and lzop needs the lzop program
+
+    compression_level:
+    Default: None
+    The compression level to use. None uses the codec's default (bzip2: 9, gzip: 6, zstd: 3, lzop: 3). The none compression doesn't take a level
+
+    chunk_in_parallel:
+    Default: None
+    The number of processes to build the S3 chunks in. Each process converts, writes, and compresses one chunk at a time, and the chunks are still uploaded in order. Chunks that are checked against sampled column types (see infer_sample_rows) are built in a single process
+
+    upload_queue_size:
+    Default: None
+    Each chunk starts uploading to S3 as soon as it's built. This is the most built chunks that can wait for an upload thread, which keeps the chunk building from getting far ahead of the uploads and holding too many chunks in memory. None means 10, the number of upload threads
+
+    presort:
+    Default: False
+    Sorts the rows by the sortkey before they're uploaded, so each COPY appends sorted rows and the table needs less VACUUM SORT. Sources too large to sort in memory are sorted in runs of about 256MB of memory that are spilled to temporary files and merged. Numbers, dates, and times are ordered by value, and nulls go last. Needs a sortkey and the column checks, so it can't be combined with skip_checks, raw_passthrough, or sampling
+
+    memory_budget:
+    Default: None
+    The most bytes of built chunks to hold in memory while they wait to be uploaded. With a budget, the chunk building no longer waits for the uploads (unless upload_queue_size is set), and chunks past the budget are written to temporary files instead. Those are uploaded with boto3's managed file transfer and deleted once they're in S3. None keeps every waiting chunk in memory, limited by upload_queue_size
+
+    multipart_threshold:
+    Default: 16MB (16 * 1024 ** 2)
+    Chunks of at least this many bytes are sent as S3 multipart uploads, so a failed request only resends one part and a chunk can use several connections. A multipart upload that fails is aborted. None sends each chunk in a single request, unless it's over S3's 5GB limit
+
+    multipart_chunksize:
+    Default: 8MB (8 * 1024 ** 2)
+    The size of each part of a multipart upload. S3 needs at least 5MB
+
+    multipart_concurrency:
+    Default: 4
+    How many parts of a chunk are uploaded at once. Up to 10 chunks upload at a time, so this many connections are used for each
+
+    s3_backend:
+    Default: "threads"
+    How the chunks are uploaded to S3. "threads" uploads with boto3 from 10 threads. "asyncio" uploads with aiobotocore's non-blocking client from a single event loop, keeping up to 200 requests (puts and multipart parts) in flight at once, and up to upload_queue_size chunks (default 10). It needs the aiobotocore package (`pip install aiobotocore`) and can't be combined with memory_budget. Code already running an event loop can await Interface.load_to_s3_async directly
     """.strip()
     ret = "\n".join(line.lstrip() for line in ret.split("\n"))
     print(ret)
@@ -1,141 +1,43 @@
-import datetime
-from typing import Dict, List
-
-
-def date_func(x: str, _: Dict) -> bool:
-    """Tests if the string is a valid date"""
-    # Timestamp must be between 4713-01-01 BC and 5874897-12-31. Not implemented because it seems unnecessary
-    if x == "":
-        return True
-    try:
-        datetime.datetime.strptime(x, "%Y-%m-%d")
-        # TODO implement min/max valid range
-        return True
-    except:  # noqa
-        return False
-
-
-def timestamptz_func(x: str, _: Dict) -> bool:
-    """Tests if the string is a valid timestamptz"""
-    # Timestamp must be between 4713-01-01 00:00:00 BC and 5874897-12-31 12:59:59. Not implemented because it seems unnecessary
-    if x == "":
-        return True
-    for fmt in ("%Y-%m-%d %H:%M:%S%z", "%Y-%m-%d %H:%M:%S%f%z", "%Y-%m-%d %H:%M%z"):
-        try:
-            datetime.datetime.strptime(x, fmt)
-            return True
-        except:  # noqa
-            pass
-    return False
-
-
-def timestamp_func(x: str, _: Dict) -> bool:
-    """Tests if the string is a valid timestamp"""
-    # Timestamp must be between 4713-01-01 00:00:00 BC and 5874897-12-31 12:59:59. Not implemented because it seems unnecessary
-    if x == "":
-        return True
-    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M:%S%f", "%Y-%m-%d %H:%M"):
-        try:
-            datetime.datetime.strptime(x, fmt)
-            return True
-        except:  # noqa
-            pass
-    return False
-
-
-def smallint_func(x: str, _: Dict) -> bool:
-    """Tests if the string is a valid smallint"""
-    if x == "":
-        return True
-    x = x.rstrip("0").rstrip(".")
-    try:
-        y = int(x)
-        assert -32768 <= y <= 32767
-        return True
-    except:  # noqa
-        return False
-
-
-def int_func(x: str, _: Dict) -> bool:
-    """Tests if the string is a valid int"""
-    if x == "":
-        return True
-    x = x.rstrip("0").rstrip(".")
-    try:
-        y = int(x)
-        assert -2147483648 <= y <= +2147483647
-        return True
-    except:  # noqa
-        return False
-
-
-def bigint_func(x: str, _: Dict) -> bool:
-    """Tests if the string is a valid bigint"""
-    if x == "":
-        return True
-    x = x.rstrip("0").rstrip(".")
-    # rstrip would take 1.1.0.0 -> 1.1, so we do it in two steps. Technically,
-    # this would take 1234..0 -> 1234, but that's a problem for future me
-    # The solution is to use removesuffix("."), but it was only added in 3.9 :(
-    try:
-        y = int(x)
-        assert -9223372036854775808 <= y <= 9223372036854775807
-        return True
-    except:  # noqa
-        return False
-
-
-def double_precision_func(x: str, _: Dict) -> bool:
-    """Tests if the string is a valid double precision"""
-    if x == "":
-        return True
-    try:
-        float(x)
-        return True
-    except:  # noqa
-        return False
-
-
-def boolean_func(x: str, _: Dict) -> bool:
-    """Tests if the string is a valid boolean"""
-    if x == "":
-        return True
-    bool_opts = ["0", "1", "true", "false"]
-    return str(x).lower() in bool_opts
-
-
-def varchar_func(x: str, type_info: Dict) -> bool:
-    """Tests if the string is a string less than 65536 bytes"""
-    row_len = len(str(x).encode("utf-8"))
-    type_info["suffix"] = max(row_len, type_info["suffix"] or 1)
-    return row_len < 65536
-
-
-def timetz_func(x: str, _: Dict) -> bool:
-    """Tests if the string is a valid timetz"""
-    if x == "":
-        return True
-    try:
-        datetime.datetime.strptime(x, "%H:%M:%S%z")
-        return True
-    except:  # noqa
-        return False
-
-
-def time_func(x: str, _: Dict) -> bool:
-    """Tests if the string is a valid time"""
-    if x == "":
-        return True
-    try:
-        datetime.datetime.strptime(x, "%H:%M:%S")
-        return True
-    except:  # noqa
-        return False
-
-
-def not_implemented(x: str, _: Dict) -> bool:
-    """Default function"""
-    return False
+import numpy
+import pandas  # type: ignore
+from typing import Dict, List, Optional
+
+try:
+    import constants  # type: ignore
+    from type_classifiers import VECTORIZED_KERNELS, codepoints  # type: ignore
+    from type_classifiers import SMALLINT_RANGE, INTEGER_RANGE, BIGINT_RANGE  # type: ignore
+    from type_classifiers import (  # type: ignore # noqa
+        date_func,
+        timestamptz_func,
+        timestamp_func,
+        smallint_func,
+        int_func,
+        bigint_func,
+        double_precision_func,
+        boolean_func,
+        varchar_func,
+        timetz_func,
+        time_func,
+        not_implemented,
+    )
+except ModuleNotFoundError:
+    from . import constants
+    from .type_classifiers import VECTORIZED_KERNELS, codepoints
+    from .type_classifiers import SMALLINT_RANGE, INTEGER_RANGE, BIGINT_RANGE
+    from .type_classifiers import (  # noqa
+        date_func,
+        timestamptz_func,
+        timestamp_func,
+        smallint_func,
+        int_func,
+        bigint_func,
+        double_precision_func,
+        boolean_func,
+        varchar_func,
+        timetz_func,
+        time_func,
+        not_implemented,
+    )
 
 
 DATATYPES = [
@@ -160,6 +62,199 @@ EXTRA_DATATYPES = [  # can be verified, but not automatically discovered
 ]
 
 
+IMPLIED_TYPES = {  # every non-null value that passes the key's func also passes the funcs of these types
+    "SMALLINT": frozenset({"INTEGER", "BIGINT", "DOUBLE PRECISION"}),
+    "INTEGER": frozenset({"BIGINT", "DOUBLE PRECISION"}),
+    "BIGINT": frozenset({"DOUBLE PRECISION"}),
+}
+NO_IMPLIED_TYPES: frozenset = frozenset()
+INTEGER_RANGES = [
+    ("SMALLINT", SMALLINT_RANGE),
+    ("INTEGER", INTEGER_RANGE),
+    ("BIGINT", BIGINT_RANGE),
+]
+
+
+def dtype_type(series: pandas.Series) -> Optional[str]:
+    """
+    The type string inference would find for the column once it's written with to_csv, taken from its dtype and min/max alone.
+    Returns None when the dtype can't settle it, such as object columns, tz-aware datetimes and integers outside of BIGINT
+    """
+    type_name = constants.DTYPE_MAPS.get(series.dtype.kind)
+    values = series.dropna()
+    if type_name is None or len(values) == 0:
+        return None
+    if series.dtype.kind == "M":
+        if (
+            getattr(series.dtype, "tz", None) is not None
+            or (values.dt.nanosecond != 0).any()
+        ):  # to_csv writes offsets and nanoseconds, which need the string checks
+            return None
+        return "DATE" if (values == values.dt.normalize()).all() else "TIMESTAMP"
+    if series.dtype.kind == "f":
+        floats = values.to_numpy(dtype=numpy.float64)
+        if not (
+            numpy.isfinite(floats).all()
+            and (floats == numpy.floor(floats)).all()
+            and numpy.abs(floats).max() < constants.MAX_EXACT_FLOAT
+        ):
+            return type_name  # written as decimals, nan or inf, or scientific notation
+        low, high = int(floats.min()), int(floats.max())
+    elif series.dtype.kind in "iu":
+        low, high = int(values.min()), int(values.max())
+    else:
+        return type_name
+    return next(
+        (name for name, (lo, hi) in INTEGER_RANGES if lo <= low and high <= hi), None
+    )
+
+
 def get_possible_data_types() -> List[Dict]:
     """Returns a dictionary of the possible datatypes, with a suffix in case there needs more specification (currently only used to house the length of varchars)"""
     return [{**dt, "suffix": None} for dt in DATATYPES]
+
+
+class ColumnInference:
+    """
+    Tracks the viable types of a single column as its values are seen one at a time.
+    The candidates stay ordered from most to least specific. Each value is tested against the most specific candidate first,
+    and the candidates it implies (see IMPLIED_TYPES) are kept without being tested.
+    VARCHAR is handled separately as a running max of the byte length, so a column that can only be a VARCHAR costs one length check per value
+    """
+
+    def __init__(self, candidates: List[Dict]) -> None:
+        self.varchar = next((x for x in candidates if x["type"] == "VARCHAR"), None)
+        self.max_length = 0
+        self._set_candidates([x for x in candidates if x["type"] != "VARCHAR"])
+
+    def _set_candidates(self, candidates: List[Dict]) -> None:
+        self.candidates = candidates
+        implied = (
+            IMPLIED_TYPES.get(candidates[0]["type"], NO_IMPLIED_TYPES)
+            if candidates
+            else NO_IMPLIED_TYPES
+        )
+        self._rest_implied = all(
+            x["type"] in implied for x in candidates[1:]
+        )  # when true, a value that passes the first candidate can't eliminate any other
+
+    @property
+    def viable(self) -> bool:
+        return bool(self.candidates) or self.varchar is not None
+
+    def update(self, x: str) -> bool:
+        """Narrows the candidates using the value x. Returns whether any candidate is still viable"""
+        if x == "":  # every type accepts nulls
+            return self.viable
+        if self.varchar is not None:
+            length = len(x.encode("utf-8"))
+            if length > self.max_length:
+                self.max_length = length
+                if length >= 65536:
+                    self.varchar = None
+        candidates = self.candidates
+        if not candidates:
+            return self.varchar is not None
+
+        first = candidates[0]
+        if first["func"](x, first):
+            if self._rest_implied:
+                return True
+            remaining = [first]
+            implied = IMPLIED_TYPES.get(first["type"], NO_IMPLIED_TYPES)
+        else:
+            remaining = []
+            implied = NO_IMPLIED_TYPES
+        for type_info in candidates[1:]:
+            if type_info["type"] in implied or type_info["func"](x, type_info):
+                remaining.append(type_info)
+                if type_info["type"] in IMPLIED_TYPES:
+                    implied = implied | IMPLIED_TYPES[type_info["type"]]
+        if len(remaining) != len(candidates):
+            self._set_candidates(remaining)
+        return self.viable
+
+    @classmethod
+    def from_column(
+        cls, values: numpy.ndarray, candidates: List[Dict]
+    ) -> "ColumnInference":
+        """
+        Infers the types of a whole column at once, rather than value by value.
+        Repeated values are only checked once, and the vectorized kernels in type_classifiers settle the common layouts,
+        so only the remaining values go through each type's func
+        """
+        inference = cls(candidates)
+        values = pandas.unique(values)
+        values = values[values != ""]  # every type accepts nulls
+        if len(values) == 0:
+            return inference
+
+        lengths = numpy.fromiter(map(len, values), dtype=numpy.int64, count=len(values))
+        if inference.varchar is not None:
+            if "".join(values).isascii():  # then the utf-8 length is the same
+                inference.max_length = int(lengths.max())
+            else:
+                inference.max_length = max(len(x.encode("utf-8")) for x in values)
+            if inference.max_length >= 65536:
+                inference.varchar = None
+        codes = None
+        viable = []
+        implied = NO_IMPLIED_TYPES
+        for type_info in inference.candidates:
+            if type_info["type"] not in implied:
+                if not type_info["func"](
+                    values[0], type_info
+                ):  # most types that don't fit fail on any value, so this skips the kernel
+                    continue
+                kernel = VECTORIZED_KERNELS.get(type_info["type"])
+                if kernel is not None and codes is None:
+                    codes = codepoints(values)
+                unsettled = (
+                    values if kernel is None else values[~kernel(codes, lengths)]
+                )
+                if not all(type_info["func"](x, type_info) for x in unsettled):
+                    continue
+            viable.append(type_info)
+            implied = implied | IMPLIED_TYPES.get(type_info["type"], NO_IMPLIED_TYPES)
+        inference._set_candidates(viable)
+        return inference
+
+    @classmethod
+    def from_dtype(
+        cls, series: pandas.Series, candidates: List[Dict]
+    ) -> Optional["ColumnInference"]:
+        """
+        Infers the type of a typed DataFrame column from its dtype, without looking at the strings.
+        Returns None when the column still needs the string checks, including when the dtype's type isn't a candidate
+        """
+        type_name = dtype_type(series)
+        if type_name is None or type_name not in {x["type"] for x in candidates}:
+            return None
+        implied = IMPLIED_TYPES.get(type_name, NO_IMPLIED_TYPES)
+        return cls(
+            [x for x in candidates if x["type"] == type_name or x["type"] in implied]
+        )
+
+    def merge(self, other: "ColumnInference") -> None:
+        """
+        Joins in the inference of another part of the same column.
+        A type stays viable only if it was viable for both parts, and the varchar width is the larger of the two
+        """
+        other_types = {x["type"] for x in other.candidates}
+        self._set_candidates([x for x in self.candidates if x["type"] in other_types])
+        if self.varchar is None or other.varchar is None:
+            self.varchar = None
+        else:
+            self.max_length = max(self.max_length, other.max_length)
+
+    def viable_types(self) -> List[Dict]:
+        """Returns the viable types, most specific first"""
+        ret = list(self.candidates)
+        if self.varchar is not None:
+            self.varchar["suffix"] = max(self.max_length, 1)
+            ret.append(self.varchar)
+        return ret
+
+    def column_type(self) -> Dict:
+        """Returns the most specific viable type"""
+        return self.viable_types()[0]
@@ -0,0 +1,144 @@
+import bz2
+import shutil
+import subprocess
+import zlib
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+class NoCompressor:
+    """
+    Passes the data through unchanged, for uploading uncompressed chunks
+    """
+
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def flush(self) -> bytes:
+        return b""
+
+
+class LzopCompressor:
+    """
+    There's no lzop module, so the data is piped through the lzop program. The data is collected until flush,
+    since writing to and reading from the same pipe a piece at a time can deadlock
+    """
+
+    def __init__(self, level: int) -> None:
+        self.level = level
+        self.parts: List[bytes] = []
+
+    def compress(self, data: bytes) -> bytes:
+        self.parts.append(data)
+        return b""
+
+    def flush(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return subprocess.run(
+            ["lzop", f"-{self.level}", "--stdout"],
+            input=data,
+            stdout=subprocess.PIPE,
+            check=True,
+        ).stdout
+
+
+def gzip_compressor(level: int) -> Any:
+    return zlib.compressobj(
+        level, zlib.DEFLATED, 31
+    )  # a wbits of 31 writes the gzip header and trailer, which COPY needs
+
+
+def zstd_compressor(level: int) -> Any:
+    import zstandard  # type: ignore
+
+    return zstandard.ZstdCompressor(level=level).compressobj()
+
+
+def zstd_missing() -> Optional[str]:
+    try:
+        import zstandard  # type: ignore # noqa
+    except ModuleNotFoundError:
+        return "The zstd compression needs the zstandard package. You can install it with `pip install simple_redshift_upload[zstd]`"
+    return None
+
+
+def lzop_missing() -> Optional[str]:
+    if shutil.which("lzop") is None:
+        return "The lzop compression needs the lzop program to be installed and on the PATH"
+    return None
+
+
+class Codec:
+    """
+    A compression COPY can read. Holds the keyword COPY needs for it, the levels it accepts, and how to make an incremental compressor,
+    which has the same compress/flush methods as bz2.BZ2Compressor
+    """
+
+    def __init__(
+        self,
+        copy_keyword: str,
+        levels: range,
+        default_level: int,
+        compressor: Callable[[int], Any],
+        missing: Callable[[], Optional[str]] = lambda: None,
+    ) -> None:
+        self.copy_keyword = copy_keyword
+        self.levels = levels
+        self.default_level = default_level
+        self.compressor = compressor
+        self.missing = missing  # returns why the codec can't be used here, if it can't
+
+
+CODECS: Dict[str, Codec] = {
+    "bzip2": Codec("BZIP2", range(1, 10), 9, bz2.BZ2Compressor),
+    "gzip": Codec("GZIP", range(0, 10), 6, gzip_compressor),
+    "zstd": Codec("ZSTD", range(1, 23), 3, zstd_compressor, zstd_missing),
+    "lzop": Codec("LZOP", range(1, 10), 3, LzopCompressor, lzop_missing),
+    "none": Codec("", range(0), 0, lambda level: NoCompressor()),
+}
+
+
+def check_codec(name: str, level: Optional[int]) -> None:
+    """
+    Raises a ValueError if the codec doesn't exist, doesn't take the level, or can't be used on this machine
+    """
+    if name not in CODECS:
+        raise ValueError(
+            f"The compression must be one of: {', '.join(CODECS.keys())}. Currently it is set to \"{name}\""
+        )
+    codec = CODECS[name]
+    if level is not None and (not isinstance(level, int) or level not in codec.levels):
+        if not codec.levels:
+            raise ValueError(f"The {name} compression doesn't take a level")
+        raise ValueError(
+            f"The {name} compression_level must be an integer from {codec.levels[0]} to {codec.levels[-1]}"
+        )
+    missing = codec.missing()
+    if missing:
+        raise ValueError(missing)
+
+
+def compressor(name: str, level: Optional[int] = None) -> Any:
+    """
+    An incremental compressor for the codec, at its default level if none is given
+    """
+    codec = CODECS[name]
+    return codec.compressor(codec.default_level if level is None else level)
+
+
+def compress(data: bytes, name: str, level: Optional[int] = None) -> bytes:
+    """
+    Compresses all of the data at once
+    """
+    return compress_blocks([data], name, level)
+
+
+def compress_blocks(
+    blocks: Iterable[bytes], name: str, level: Optional[int] = None
+) -> bytes:
+    """
+    Compresses the blocks as a single stream, so only one block has to be held uncompressed at a time
+    """
+    ret = compressor(name, level)
+    parts = [ret.compress(block) for block in blocks]
+    parts.append(ret.flush())
+    return b"".join(parts)
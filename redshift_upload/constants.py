@@ -1,6 +1,6 @@
 import numpy
 import re
-from typing import Dict, List, Union
+from typing import Dict, List, NamedTuple, Union
 import io
 import pandas  # type: ignore
 from mypy_boto3_s3 import Client
@@ -8,16 +8,20 @@ from psycopg2.extensions import connection  # type: ignore
 
 
 NaT = numpy.datetime64("NaT")
-DTYPE_MAPS = {
-    "int64": "bigint",
-    "float64": "double precision",
-    "bool": "bool",
-    "datetime64[ns]": "timestamp",
+DTYPE_MAPS = {  # numpy dtype kind -> the widest Redshift type for it. Narrowed using the column's values
+    "i": "BIGINT",
+    "u": "BIGINT",
+    "f": "DOUBLE PRECISION",
+    "b": "BOOLEAN",
+    "M": "TIMESTAMP",
 }
+MAX_EXACT_FLOAT = (
+    1e16  # floats at least this large are written in scientific notation by to_csv
+)
 UPLOAD_DEFAULTS = {
     "truncate_table": False,
     "drop_table": False,
-    "cleanup_s3": True,
+    "cleanup_s3": True,  # "background" deletes the files on a separate thread
     "close_on_end": True,
     "grant_access": [],
     "diststyle": "even",
@@ -28,18 +32,73 @@ UPLOAD_DEFAULTS = {
     "skip_checks": False,
     "stream_from_file": False,
     "skip_views": False,
-    "node_count": 1,
+    "node_count": None,  # None looks up the cluster's slice count
     "default_timeout": 30 * 60 * 1000,  # 30 minutes
     "lock_timeout": 5 * 1000,  # 5 seconds
     "allow_alter_table": False,
+    "columnar_inference": False,
+    "infer_in_parallel": None,  # count of processes
+    "infer_sample_rows": None,
+    "infer_sample_fraction": None,
+    "raw_passthrough": False,
+    "compression": "bzip2",
+    "compression_level": None,  # None uses the codec's default
+    "chunk_in_parallel": None,  # count of processes
+    "upload_queue_size": None,  # count of built chunks waiting to be uploaded. None means MAX_THREAD_COUNT
+    "presort": False,
+    "memory_budget": None,  # bytes of built chunks held in memory until they're uploaded. Past it, chunks are spilled to disk
+    "multipart_threshold": 16 * 1024 ** 2,  # None only splits chunks over 5GB
+    "multipart_chunksize": 8 * 1024 ** 2,
+    "multipart_concurrency": 4,  # parts of a chunk uploaded at once
+    "s3_backend": "threads",  # or "asyncio", which needs aiobotocore
 }
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
 DATE_FORMAT = "%Y-%m-%d"
 MAX_COLUMN_LENGTH = 63
 MAX_THREAD_COUNT = 10
+MAX_ASYNC_REQUESTS = 200  # S3 requests the asyncio backend keeps in flight at once
+S3_DELETE_BATCH_SIZE = 1000  # the most keys a delete_objects request takes
+S3_POOL_CONNECTIONS = 50  # enough for the upload threads to each send a few parts of a multipart upload at once
+MIN_MULTIPART_CHUNKSIZE = 5 * 1024 ** 2  # S3 rejects smaller parts, except for the last
+MAX_PUT_SIZE = 5 * 1024 ** 3  # the largest object S3 accepts in a single request
+ROW_INDEX_STRIDE = 256  # a MappedSource keeps the offset of every this many rows
+READ_BLOCK_SIZE = (
+    4 * 1024 ** 2
+)  # how much of a MappedSource is indexed or decoded at once
+SAMPLE_HEAD_ROWS = 1000  # the first rows are always part of a sample
+MIN_INFER_SEGMENT_SIZE = (
+    16 * 1024 ** 2
+)  # smaller pieces aren't worth starting a process for
+WRITE_BLOCK_ROWS = 10000  # rows of a chunk written at a time before compressing
+COMPRESSION_SAMPLE_SIZE = (
+    1024 ** 2
+)  # how much of a source is compressed to measure the compression ratio
+MIN_CHUNK_SIZE = 1024 ** 2  # the smallest compressed file AWS recommends for COPY
+PRESORT_RUN_SIZE = (
+    256 * 1024 ** 2
+)  # bytes of memory the rows sorted at once can take before a run is spilled to disk
+PRESORT_KEY_SIZE = (
+    100  # bytes list.sort holds per row for its key, a (bool, value) tuple
+)
+TARGET_CHUNK_SIZE = (
+    64 * 1024 ** 2
+)  # well inside the 1MB-1GB AWS recommends, so the chunks being uploaded don't take much memory
+COMPRESSED_SOURCES = {
+    ".csv.gz": "GZIP",
+    ".csv.bz2": "BZIP2",
+}  # compressed files COPY can read as they are
 MAX_VARCHAR_LENGTH = (
     65535  # max limit in Redshift, as of 2020/03/27, but probably forever
 )
 varchar_len_re = re.compile(r"\((\d+)\)")
 SourceOptions = Union[str, io.StringIO, List[Dict], pandas.DataFrame]
+
+
+class LocalFile(NamedTuple):
+    """A chunk that's already a file, like a forwarded .csv.gz. It's uploaded from the path, and the file is never deleted"""
+
+    path: str
+
+
+Chunk = Union[bytes, LocalFile]
 Connection = Union[Client, connection]
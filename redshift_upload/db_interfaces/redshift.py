@@ -1,11 +1,22 @@
 import psycopg2
 import psycopg2.sql
 import boto3
+import boto3.s3.transfer  # type: ignore
 import botocore
+import botocore.config  # type: ignore
+import io
+import asyncio
+import atexit
+import base64
 import datetime
+import hashlib
+import json
 import logging
-import multiprocessing.pool
-from typing import Dict, List, Tuple
+import os
+import queue
+import tempfile
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 if __name__ == "__main__":
     import sys
@@ -25,6 +36,73 @@ with base_utilities.change_directory():
     competing_conns_query = open("redshift_queries/competing_conns.sql", "r").read()
     copy_table_query = open("redshift_queries/copy_table.sql", "r").read()
     view_privileges = open("redshift_queries/view_privileges.sql").read()
+slice_counts: Dict[
+    str, int
+] = {}  # per host. A cluster's slice count only changes when it's resized
+pending_cleanups: Set[
+    threading.Thread
+] = (
+    set()
+)  # background S3 cleanups that haven't finished. Joined when the interpreter exits
+
+
+@atexit.register
+def join_cleanups() -> None:
+    for thread in list(pending_cleanups):
+        thread.join()
+
+
+def content_md5(digest: Any) -> str:
+    """The Content-MD5 header for a body with this md5 digest, which S3 checks the body against"""
+    return base64.b64encode(digest.digest()).decode("ascii")
+
+
+def check_etag(key: str, response: Dict, digest: Any) -> None:
+    """
+    Raises a ValueError if the ETag S3 returned for a put isn't the md5 of what was sent.
+    With KMS encryption, the ETag isn't the MD5 of the object, so it isn't checked
+    """
+    if (
+        response.get("ServerSideEncryption") != "aws:kms"
+        and response.get("ETag", "").strip('"') != digest.hexdigest()
+    ):
+        raise ValueError(
+            f"The ETag of {key} doesn't match the chunk that was uploaded.\n{str(response)}"
+        )
+
+
+def read_range(path: str, start: int, size: int) -> bytes:
+    """Up to size bytes of the file at path, from start"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(size)
+
+
+def aiobotocore_session() -> Any:
+    """
+    A session of the non-blocking S3 client the asyncio backend uses. aiobotocore is optional, so it's only imported here
+    """
+    try:
+        import aiobotocore.session  # type: ignore
+    except ModuleNotFoundError:
+        raise ModuleNotFoundError(aiobotocore_missing())
+    return aiobotocore.session.get_session()
+
+
+def aiobotocore_config(max_pool_connections: int) -> Any:
+    import aiobotocore.config  # type: ignore
+
+    return aiobotocore.config.AioConfig(
+        max_pool_connections=max_pool_connections, retries={"mode": "standard"}
+    )
+
+
+def aiobotocore_missing() -> Optional[str]:
+    try:
+        import aiobotocore  # type: ignore # noqa
+    except ModuleNotFoundError:
+        return "The asyncio s3_backend needs the aiobotocore package. You can install it with `pip install simple_redshift_upload[asyncio]`"
+    return None
 
 
 class Interface:
@@ -44,6 +122,10 @@ class Interface:
 
         self._db_conn = {}
         self._s3_conn = None
+        self.s3_chunks: Dict[str, int] = {}  # key -> length, for the COPY manifest
+        self.cleanup_thread: Optional[
+            threading.Thread
+        ] = None  # set while the S3 files are deleted in the background
 
         self.default_timeout = default_timeout
         self.lock_timeout = lock_timeout
@@ -79,6 +161,17 @@ class Interface:
             cursor.execute(f"SET statement_timeout = {self.default_timeout}")
         return self._db_conn[user]
 
+    def s3_client_args(self) -> Dict:
+        """
+        The arguments both S3 backends create their connections with
+        """
+        return {
+            "aws_access_key_id": self.aws_info["s3"]["access_key"],
+            "aws_secret_access_key": self.aws_info["s3"]["secret_key"],
+            "use_ssl": False,
+            "region_name": "us-east-1",
+        }
+
     def get_s3_conn(self) -> constants.Connection:
         """
         Gets s3 connection to load data. Caches connection for later use.
@@ -86,10 +179,13 @@ class Interface:
         if self._s3_conn is None:
             self._s3_conn = boto3.resource(
                 "s3",
-                aws_access_key_id=self.aws_info["s3"]["access_key"],
-                aws_secret_access_key=self.aws_info["s3"]["secret_key"],
-                use_ssl=False,
-                region_name="us-east-1",
+                **self.s3_client_args(),
+                config=botocore.config.Config(
+                    max_pool_connections=constants.S3_POOL_CONNECTIONS,
+                    retries={
+                        "mode": "standard"
+                    },  # each request is retried on its own, so a failed part of a multipart upload doesn't resend the rest
+                ),
             )
         return self._s3_conn
 
@@ -226,64 +322,399 @@ class Interface:
             )
         return [get_view_query(row) for row in dependencies]
 
-    def load_to_s3(self, source_dfs: List[bytes]) -> None:
+    def load_to_s3(
+        self,
+        source_dfs: Iterable[Tuple[int, constants.Chunk]],
+        queue_size: Optional[int] = None,
+        memory_budget: Optional[int] = None,
+        transfer_config: Optional[boto3.s3.transfer.TransferConfig] = None,
+    ) -> None:
         """
-        Loads data to S3, using multiprocessing.pool.Threadpool to speed up process.
+        Loads data to S3 with MAX_THREAD_COUNT upload threads. The (index, chunk) pairs are pulled from source_dfs as the threads
+        take them, so each chunk starts uploading as soon as it's built, while the next ones are being built.
+        At most queue_size built chunks (default: MAX_THREAD_COUNT) wait for a thread, which stops the building from getting ahead of the uploads.
+        With a memory_budget, the building doesn't wait for the uploads (unless queue_size is set). Once the chunks waiting or uploading
+        take up memory_budget bytes, the next chunks are written to temporary files, which are uploaded with boto3's managed file transfer
+        and deleted as soon as they're uploaded.
+        Chunks of at least transfer_config.multipart_threshold bytes (and every spilled chunk) go through boto3's managed transfer, which
+        splits the larger ones into a multipart upload of transfer_config.multipart_chunksize parts, sending max_concurrency parts at once.
+        A failed multipart upload is aborted, so its parts don't linger in the bucket.
+        A LocalFile chunk is streamed from its path by the managed transfer too. It's already on disk, so it doesn't count towards the budget and is never deleted.
+        The keys are unique to the upload (see s3_name), so nothing is deleted first and there's no polling for the objects to appear.
+        A single put is confirmed by its response: S3 checks the body against the Content-MD5 sent with it, and the ETag it returns is checked
+        against the same digest. The managed transfers send checksums with each part and raise if any don't match.
+        An index can come up again when a chunk had to be rewritten. The later chunk replaces the earlier one.
+        Once every chunk is uploaded, the manifest COPY reads them from is written (see write_manifest)
         """
 
-        def loader(data) -> None:
+        def loader(data: Tuple[int, Union[bytes, str]]) -> None:
             i, source_df = data
             s3_name = self.s3_name + str(i)
             obj = self.get_s3_conn().Object(
                 self.aws_info["constants"]["bucket"], s3_name
             )
-            obj.delete()
-            obj.wait_until_not_exists()
 
             try:
-                response = obj.put(Body=source_df)
-            except botocore.exceptions.ClientError as e:
+                if isinstance(source_df, constants.LocalFile):
+                    obj.upload_file(source_df.path, Config=transfer_config)
+                    response = None
+                elif isinstance(source_df, str):  # the path of a spilled chunk
+                    obj.upload_file(source_df, Config=transfer_config)
+                    response = None
+                elif (
+                    transfer_config is not None
+                    and len(source_df) >= transfer_config.multipart_threshold
+                ):
+                    obj.upload_fileobj(io.BytesIO(source_df), Config=transfer_config)
+                    response = None
+                else:
+                    digest = hashlib.md5(source_df)
+                    response = obj.put(Body=source_df, ContentMD5=content_md5(digest))
+            except (
+                botocore.exceptions.ClientError,
+                boto3.exceptions.S3UploadFailedError,
+            ) as e:
                 if "(SignatureDoesNotMatch)" in str(e):
                     raise ValueError(
                         "The error below occurred when the S3 credentials expire"
                     )
                 raise BaseException
 
-            if response["ResponseMetadata"]["HTTPStatusCode"] != 200:
+            if (
+                response is not None
+                and response["ResponseMetadata"]["HTTPStatusCode"] != 200
+            ):  # the managed transfers raise on a failed upload instead
                 raise ValueError(
                     f"Something unusual happened in the upload.\n{str(response)}"
                 )
+            if response is not None:
+                check_etag(s3_name, response, digest)
+
+        held = 0  # bytes of the chunks in memory that haven't finished uploading
+        held_lock = threading.Lock()
+
+        def reserve(size: int, budget: int) -> bool:
+            nonlocal held
+            with held_lock:
+                if held + size > budget:
+                    return False
+                held += size
+                return True
 
-            obj.wait_until_exists()
+        def release(size: int) -> None:
+            nonlocal held
+            with held_lock:
+                held -= size
+
+        def spill(source_df: bytes) -> str:
+            with tempfile.NamedTemporaryFile(
+                prefix="redshift_upload_", delete=False
+            ) as f:
+                f.write(source_df)
+            return f.name
+
+        def worker() -> None:
+            while True:
+                item = pending.get()
+                if item is None:
+                    return
+                i, source_df, done = item
+                try:
+                    if (
+                        not failures
+                    ):  # after a failure, the rest are only drained so the producer can't block
+                        loader((i, source_df))
+                except BaseException as e:
+                    failures.append(e)
+                finally:
+                    if isinstance(source_df, str):
+                        os.remove(source_df)
+                    elif memory_budget is not None and isinstance(source_df, bytes):
+                        release(len(source_df))
+                    done.set()
 
         self.get_s3_conn()  # we need an initial call to initialize the S3 conn. Otherwise the threads will simultaneously create multiple instances, causing the error here: https://stackoverflow.com/questions/52675027/why-do-i-sometimes-get-key-error-using-sqs-client
-        log.info(f"Loading table to S3 in {len(source_dfs)} chunks")
-        with multiprocessing.pool.ThreadPool(
-            processes=min(len(source_dfs), constants.MAX_THREAD_COUNT)
-        ) as pool:
-            pool.map(loader, enumerate(source_dfs))
+        log.info("Loading table to S3")
+        pending: queue.Queue = queue.Queue(
+            maxsize=queue_size
+            or (0 if memory_budget is not None else constants.MAX_THREAD_COUNT)
+        )  # a maxsize of 0 doesn't limit the queue
+        spilled = 0
+        failures: List[BaseException] = []
+        uploads: Dict[int, threading.Event] = {}
+        threads = [
+            threading.Thread(target=worker, daemon=True)
+            for _ in range(constants.MAX_THREAD_COUNT)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for i, source_df in source_dfs:
+                if failures:
+                    break
+                if (
+                    i in uploads
+                ):  # a rewritten chunk can't be uploaded alongside the original, or the two would race
+                    uploads[i].wait()
+                uploads[i] = threading.Event()
+                self.s3_chunks[self.s3_name + str(i)] = (
+                    os.path.getsize(source_df.path)
+                    if isinstance(source_df, constants.LocalFile)
+                    else len(source_df)
+                )
+                if (
+                    memory_budget is not None
+                    and isinstance(source_df, bytes)
+                    and not reserve(len(source_df), memory_budget)
+                ):
+                    pending.put((i, spill(source_df), uploads[i]))
+                    spilled += 1
+                else:
+                    pending.put((i, source_df, uploads[i]))
+        finally:
+            for _ in threads:
+                pending.put(None)
+            for thread in threads:
+                thread.join()
+        if failures:
+            raise failures[0]
+        log.info(f"Loaded table to S3 in {len(uploads)} chunks")
+        self.write_manifest()
+        if spilled:
+            log.info(
+                f"{spilled} chunks went over the memory budget and were spilled to disk"
+            )
 
-    def cleanup_s3(self, parallel_loads: int) -> None:
+    async def load_to_s3_async(
+        self,
+        source_dfs: Iterable[Tuple[int, constants.Chunk]],
+        queue_size: Optional[int] = None,
+        transfer_config: Optional[boto3.s3.transfer.TransferConfig] = None,
+        concurrency: int = constants.MAX_ASYNC_REQUESTS,
+    ) -> None:
         """
-        Attempts to delete S3 files used to copy to Redshift.
-        If it cannot delete, it will attempt to overwrite the S3 object for security and space savings
+        The asyncio backend of load_to_s3, which can be awaited from a running event loop. Uploads with aiobotocore's non-blocking client,
+        so one thread keeps up to concurrency requests (puts and multipart parts) in flight, where the threads backend has one per thread.
+        The chunks are built by source_dfs in an executor thread, so the building doesn't block the event loop.
+        At most queue_size built chunks (default: MAX_THREAD_COUNT) are uploading at once, which stops the building from getting ahead of the uploads.
+        Chunks of at least transfer_config.multipart_threshold bytes are sent as multipart uploads of transfer_config.multipart_chunksize parts.
+        Every put and part is sent with a Content-MD5 and its ETag is checked (see check_etag). Each request is retried on its own,
+        and a multipart upload that fails is aborted. Once every chunk is uploaded, the manifest is written.
+        A LocalFile chunk is read from its path in an executor thread, one part at a time, and is never deleted
         """
-        for i in range(parallel_loads):
-            obj = self.get_s3_conn().Object(
-                self.aws_info["constants"]["bucket"], self.s3_name + str(i)
+
+        async def read(source_df: constants.Chunk, start: int, size: int) -> bytes:
+            if isinstance(source_df, bytes):
+                return source_df[start : start + size]  # noqa
+            return await loop.run_in_executor(
+                None, read_range, source_df.path, start, size
             )
+
+        async def put(key: str, body: bytes) -> Dict:
+            digest = hashlib.md5(body)
+            async with requests:
+                response = await client.put_object(
+                    Bucket=bucket, Key=key, Body=body, ContentMD5=content_md5(digest)
+                )
+            check_etag(key, response, digest)
+            return response
+
+        async def put_part(
+            key: str,
+            upload_id: str,
+            number: int,
+            source_df: constants.Chunk,
+            start: int,
+        ) -> Dict:
+            async with requests:
+                part = await read(
+                    source_df, start, transfer_config.multipart_chunksize  # type: ignore
+                )  # read here, so only the parts being sent are in memory
+                digest = hashlib.md5(part)
+                response = await client.upload_part(
+                    Bucket=bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=number,
+                    Body=part,
+                    ContentMD5=content_md5(digest),
+                )
+            check_etag(f"part {number} of {key}", response, digest)
+            return {"ETag": response["ETag"], "PartNumber": number}
+
+        async def put_multipart(
+            key: str, source_df: constants.Chunk, size: int
+        ) -> None:
+            async with requests:
+                upload_id = (
+                    await client.create_multipart_upload(Bucket=bucket, Key=key)
+                )["UploadId"]
+            parts = [
+                asyncio.ensure_future(
+                    put_part(key, upload_id, number, source_df, start)
+                )
+                for number, start in enumerate(
+                    range(0, size, transfer_config.multipart_chunksize), 1  # type: ignore
+                )
+            ]
             try:
-                obj.delete()
-            except Exception as e:
-                log.error(
-                    "Could not delete {}\nException: {}".format(
-                        self.s3_name + str(i), e
+                await asyncio.gather(*parts)
+                async with requests:
+                    await client.complete_multipart_upload(
+                        Bucket=bucket,
+                        Key=key,
+                        UploadId=upload_id,
+                        MultipartUpload={"Parts": [part.result() for part in parts]},
                     )
+            except BaseException:
+                await cancel(parts)  # so no part is still being sent once aborted
+                await client.abort_multipart_upload(
+                    Bucket=bucket, Key=key, UploadId=upload_id
                 )
-                log.error(
-                    "Attempting to Overwrite with empty string to minimze storage use"
-                )
-                obj.put(Body=b"")
+                raise
+
+        async def loader(i: int, source_df: constants.Chunk) -> None:
+            key = self.s3_name + str(i)
+            size = self.s3_chunks[key]
+            if (
+                transfer_config is not None
+                and size >= transfer_config.multipart_threshold
+            ):
+                await put_multipart(key, source_df, size)
+            else:
+                await put(key, await read(source_df, 0, size))
+
+        def finished(upload: asyncio.Future) -> None:
+            running.discard(upload)
+            if upload.cancelled():
+                return
+            error = upload.exception()
+            if error is not None:
+                failures.append(error)
+
+        async def cancel(tasks: Iterable[asyncio.Future]) -> None:
+            tasks = list(tasks)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        loop = asyncio.get_running_loop()
+        bucket = self.aws_info["constants"]["bucket"]
+        requests = asyncio.Semaphore(concurrency)
+        chunks = iter(source_dfs)
+        uploads: Dict[int, asyncio.Future] = {}
+        running: Set[asyncio.Future] = set()
+        failures: List[BaseException] = []
+        log.info("Loading table to S3")
+        async with aiobotocore_session().create_client(
+            "s3",
+            **self.s3_client_args(),
+            config=aiobotocore_config(concurrency),
+        ) as client:
+            try:
+                while True:
+                    item = await loop.run_in_executor(None, next, chunks, None)
+                    if failures:
+                        raise failures[0]
+                    if item is None:
+                        break
+                    i, source_df = item
+                    if (
+                        i in uploads
+                    ):  # a rewritten chunk can't be uploaded alongside the original, or the two would race
+                        await uploads[i]
+                    self.s3_chunks[self.s3_name + str(i)] = (
+                        os.path.getsize(source_df.path)
+                        if isinstance(source_df, constants.LocalFile)
+                        else len(source_df)
+                    )
+                    uploads[i] = asyncio.ensure_future(loader(i, source_df))
+                    running.add(uploads[i])
+                    uploads[i].add_done_callback(finished)
+                    if len(running) >= (queue_size or constants.MAX_THREAD_COUNT):
+                        await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                await asyncio.gather(*running)
+            except BaseException:
+                await cancel(running)
+                raise
+            log.info(f"Loaded table to S3 in {len(uploads)} chunks")
+            await put(self.manifest_key, self.manifest())
+
+    @property
+    def manifest_key(self) -> str:
+        return self.s3_name + ".manifest"
+
+    def manifest(self) -> bytes:
+        """
+        The COPY manifest, which lists the exact key and content length of every chunk in s3_chunks.
+        COPY reads the manifest instead of listing the bucket for the s3_name prefix, so it loads only these files, and fails if one is missing
+        """
+        bucket = self.aws_info["constants"]["bucket"]
+        manifest = {
+            "entries": [
+                {
+                    "url": f"s3://{bucket}/{key}",
+                    "mandatory": True,
+                    "meta": {"content_length": length},
+                }
+                for key, length in self.s3_chunks.items()
+            ]
+        }
+        return json.dumps(manifest).encode("utf-8")
+
+    def write_manifest(self) -> None:
+        """Uploads the manifest COPY reads the chunks from"""
+        self.get_s3_conn().Object(
+            self.aws_info["constants"]["bucket"], self.manifest_key
+        ).put(Body=self.manifest())
+
+    def cleanup_s3(self, background: bool = False) -> None:
+        """
+        Attempts to delete the S3 files in s3_chunks (and their manifest), with a delete_objects request for every S3_DELETE_BATCH_SIZE keys.
+        If it cannot delete a file, it will attempt to overwrite the S3 object for security and space savings.
+        With background, the deletes run on a daemon thread (kept in cleanup_thread) and this returns right away.
+        The thread is still joined when the interpreter exits (see join_cleanups), so the files aren't left behind
+        """
+
+        def cleanup(keys: List[str]) -> None:
+            for start in range(0, len(keys), constants.S3_DELETE_BATCH_SIZE):
+                batch = keys[start : start + constants.S3_DELETE_BATCH_SIZE]  # noqa
+                try:
+                    response = bucket.delete_objects(
+                        Delete={
+                            "Objects": [{"Key": key} for key in batch],
+                            "Quiet": True,
+                        }
+                    )
+                    failed = {
+                        error["Key"]: error.get("Message")
+                        for error in response.get("Errors", [])
+                    }  # with Quiet, only the keys that couldn't be deleted are listed
+                except Exception as e:
+                    failed = {key: e for key in batch}
+                for key, reason in failed.items():
+                    log.error(f"Could not delete {key}\nException: {reason}")
+                    log.error(
+                        "Attempting to Overwrite with empty string to minimze storage use"
+                    )
+                    try:
+                        bucket.Object(key).put(Body=b"")
+                    except Exception as e:
+                        log.error(f"Could not overwrite {key}\nException: {e}")
+            pending_cleanups.discard(threading.current_thread())
+
+        bucket = self.get_s3_conn().Bucket(
+            self.aws_info["constants"]["bucket"]
+        )  # fetched up front, since the connection is dropped at the end of an upload
+        keys = list(self.s3_chunks) + [self.manifest_key]
+        if not background:
+            cleanup(keys)
+            return
+        self.cleanup_thread = threading.Thread(
+            target=cleanup, args=(keys,), daemon=True
+        )
+        pending_cleanups.add(self.cleanup_thread)
+        self.cleanup_thread.start()
 
     def get_exclusive_lock(self) -> Tuple[constants.Connection, constants.Connection]:
         """
@@ -328,6 +759,28 @@ class Interface:
         cursor.execute(f"SET statement_timeout = {self.default_timeout}")
         return conn, cursor
 
+    def get_slice_count(self) -> int:
+        """
+        Gets the number of slices in the cluster from stv_slices, so the number of COPY files can be a multiple of it.
+        The count is cached per host. If it can't be read, the cluster is treated as having a single slice, which isn't cached,
+        so a later upload (with a connection that can read stv_slices) gets the real count
+        """
+        host = self.aws_info["db"]["host"]
+        if host not in slice_counts:
+            log.info("Getting the slice count of the cluster")
+            conn = self.get_db_conn()
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("select count(*) from stv_slices")
+                    slice_counts[host] = cursor.fetchone()[0] or 1
+            except psycopg2.Error as e:
+                conn.rollback()
+                log.warning(
+                    f"Could not read the slice count, so assuming a single slice. Set node_count to avoid this. Error: {e}"
+                )
+                return 1
+        return slice_counts[host]
+
     def check_table_exists(self) -> bool:
         """
         Checks whether the table exists using pg_tables
@@ -353,9 +806,16 @@ class Interface:
                     f"There are already other things with the name {self.schema_name}.{self.table_name}: {', '.join(existing_objs)}"
                 )
 
-    def copy_table(self, cursor: constants.Connection, columns: List[str]) -> None:
+    def copy_table(
+        self,
+        cursor: constants.Connection,
+        columns: List[str],
+        compression: str = "BZIP2",
+        header_rows: int = 0,
+    ) -> None:
         """
-        Copies the S3 file(s) to Redshift
+        Copies the S3 file(s) listed in the manifest to Redshift. compression is the COPY keyword for how the files were compressed,
+        and header_rows is the number of lines at the start of the files to skip
         """
         log.info("Copying table from S3 to Redshift")
         if columns:
@@ -364,10 +824,12 @@ class Interface:
             columns = ""
         query = copy_table_query.format(
             file_destination=self.full_table_name,
-            source=f"s3://{self.aws_info['constants']['bucket']}/{self.s3_name}",
+            source=f"s3://{self.aws_info['constants']['bucket']}/{self.manifest_key}",
             access=self.aws_info["s3"]["access_key"],
             secret=self.aws_info["s3"]["secret_key"],
             columns=columns,
+            ignore_header=f"IGNOREHEADER {header_rows}" if header_rows else "",
+            compression=compression,
         )
         cursor.execute(query)
 
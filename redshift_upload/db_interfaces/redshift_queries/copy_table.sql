@@ -1,8 +1,9 @@
 copy {file_destination} {columns} 
 from '{source}'
 credentials 'aws_access_key_id={access};aws_secret_access_key={secret}'
+manifest
 csv
 NULL ''
 FILLRECORD
-
-BZIP2
\ No newline at end of file
+{ignore_header}
+{compression}
\ No newline at end of file
@@ -1,27 +1,52 @@
+import numpy
 import pandas  # type: ignore
-from typing import Iterable, List, Dict, Tuple, Iterator, Any, Optional
+from typing import (
+    Iterable,
+    List,
+    Dict,
+    Tuple,
+    Iterator,
+    Any,
+    Optional,
+    Callable,
+    Union,
+)
 import logging
 import sys
 import io
 import csv
 import math
 import itertools
+import random
 import collections
+import multiprocessing
 import colorama
 import os
+import mmap
+import shutil
 
 colorama.init()
 import requests
 import datetime
 import getpass
 import bz2
+import gzip
+import decimal
+import heapq
+import tempfile
+import contextlib
 
 
 try:
-    import constants, column_type_utilities  # type: ignore
+    import constants, column_type_utilities, compression_utilities, type_classifiers  # type: ignore
     from db_interfaces import redshift  # type: ignore
 except ModuleNotFoundError:
-    from . import constants, column_type_utilities
+    from . import (
+        constants,
+        column_type_utilities,
+        compression_utilities,
+        type_classifiers,
+    )
     from .db_interfaces import redshift  # type: ignore
 log = logging.getLogger("redshift_utilities")
 csv_reader_type = type(
@@ -34,17 +59,54 @@ class Source:
     A class representing the data to be loaded to Redshift
     """
 
-    def __init__(self, f: io.StringIO) -> None:
-        f.seek(0, os.SEEK_END)
-        self.size = f.tell()
+    def __init__(self, f: io.StringIO, size: Optional[int] = None) -> None:
+        if size is None:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+        self.size = size
         f.seek(0)
         dict_reader = csv.DictReader(f)
         self.source = f
         self.fieldnames = dict_reader.fieldnames or []
-        self.num_rows = self._count_rows(dict_reader)
+        self._num_rows: Optional[
+            int
+        ] = None  # counted lazily, usually as a side effect of fix_column_types
         self.predefined_columns: Dict = {}
         self.column_types: Dict = {}
         self.fixed_columns: List = []
+        self.frame: Optional[
+            pandas.DataFrame
+        ] = None  # set when the source was written from a DataFrame, so its dtypes can be used
+        self.unvalidated: Optional[
+            List
+        ] = None  # inferences made from a sample. chunkify checks the rest of the rows against them
+        self.estimated_num_rows: Optional[
+            int
+        ] = None  # used in place of num_rows until the sampled types have been checked
+        self.compression: Optional[
+            str
+        ] = None  # the COPY keyword for the file's compression, when COPY can read the file as it is
+
+    @property
+    def num_rows(self) -> int:
+        """
+        The number of data rows in the source. If no scan has counted them yet, the rows are counted here
+        """
+        if self._num_rows is None:
+            self._num_rows = self._count_rows(self.dictrows())
+        return self._num_rows
+
+    @num_rows.setter
+    def num_rows(self, value: int) -> None:
+        self._num_rows = value
+
+    def is_empty(self) -> bool:
+        """
+        Checks whether there are any data rows, without reading past the first one
+        """
+        if self._num_rows is not None:
+            return self._num_rows == 0
+        return next(iter(self.dictrows()), None) is None
 
     @staticmethod
     def _count_rows(iterable: Iterable) -> int:
@@ -58,10 +120,729 @@ class Source:
         self.source.seek(0)
         return csv.DictReader(self.source)
 
-    def rows(self) -> Iterable:
+    def rows(self) -> Iterator[List[str]]:
         self.source.seek(0)
         return csv.reader(self.source)
 
+    def close(self) -> None:
+        """Lets go of anything held open to read the source. Only a MappedSource holds anything"""
+
+    def __enter__(self) -> "Source":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def rows_in(self, start: int, end: int) -> Iterator[List[str]]:
+        """The rows between two row starts, such as the ranges from split. They're read a line at a time, so the range isn't copied out whole"""
+
+        def lines() -> Iterator[str]:
+            self.source.seek(start)
+            pos = start
+            while pos < end:
+                line = self.source.readline()
+                pos += len(line)
+                yield line
+
+        return csv.reader(lines())
+
+    def split(self, count: int) -> Optional[List[Tuple[int, int]]]:
+        """
+        Splits the data rows into at most count ranges of about the same length, for rows_in.
+        Only an in-memory source can be split, since the other streams can't seek to an arbitrary position
+        """
+        if not isinstance(self.source, io.StringIO):
+            return None
+        text = self.source.getvalue()
+        header_end, _ = next_row_start(text, 0, (0, 0))
+        return split_rows(text, header_end, count)
+
+    def sample_bytes(self, size: int) -> bytes:
+        """About size bytes from the start of the source, encoded as utf-8"""
+        self.source.seek(0)
+        return self.source.read(size).encode("utf-8")
+
+    def data_rows(self) -> Iterator[List[str]]:
+        """
+        The rows after the header. Like csv.DictReader, blank lines are skipped. Short rows are padded with nulls, like FILLRECORD
+        """
+        rows = self.rows()
+        next(rows, None)  # the first is the header
+        return pad_rows(rows, len(self.fieldnames))
+
+    def columns(self) -> List[numpy.ndarray]:
+        """
+        A columnar view of the source: one array of strings per column, in the order of fieldnames
+        """
+        width = len(self.fieldnames)
+        rows = self.rows()
+        next(rows, None)  # the first is the header
+        data = [
+            row if len(row) >= width else row + [""] * (width - len(row))
+            for row in rows
+            if row
+        ]  # the same rows as data_rows, but without the generator overhead
+        columns = list(zip(*data)) or [()] * width
+        return [numpy.array(col, dtype=object) for col in columns[:width]]
+
+
+class MappedSource(Source):
+    """
+    A Source over a memory-mapped CSV file, used with stream_from_file.
+    The file is indexed once when it's loaded (see index_rows), which gives the row count and random access to ranges of rows
+    without reading the file from the start. Everything is read as utf-8
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.header_end, self.index, self.line_count, num_rows = index_rows(
+            self.mm, constants.ROW_INDEX_STRIDE
+        )
+        super().__init__(io.StringIO(self.mm[: self.header_end].decode("utf-8")))
+        self.source = self.mm  # type: ignore  # the rows are read through _lines, never through source
+        self.size = len(self.mm)
+        self.num_rows = num_rows
+
+    def close(self) -> None:
+        """Unmaps the file. Nothing can be read from the source afterwards"""
+        self.mm.close()
+
+    def _lines(self, start: int, end: int) -> Iterator[str]:
+        """The lines between two row starts, decoded a few MB at a time. The indexed rows keep a block from splitting a row"""
+        first, last = numpy.searchsorted(self.index, [start, end], side="right")
+        step = max(
+            1,
+            int(constants.READ_BLOCK_SIZE * len(self.index) / max(self.size, 1)),
+        )
+        bounds = [start, *self.index[first:last:step].tolist(), end]
+        for block_start, block_end in zip(bounds, bounds[1:]):
+            if block_end > block_start:
+                yield from io.StringIO(
+                    self.mm[block_start:block_end].decode("utf-8"), newline=""
+                )
+
+    def dictrows(self) -> csv.DictReader:
+        return csv.DictReader(self._lines(0, self.size))
+
+    def rows(self) -> Iterator[List[str]]:
+        return csv.reader(self._lines(0, self.size))
+
+    def rows_in(self, start: int, end: int) -> Iterator[List[str]]:
+        """The rows between two row starts, such as the ranges from split"""
+        return csv.reader(self._lines(start, end))
+
+    def row_at(self, block: int) -> List[str]:
+        """The first row of an indexed block, so the row numbered block * ROW_INDEX_STRIDE"""
+        start = int(self.index[block])
+        lines = (
+            self.mm[pos : self.mm.find(b"\n", pos) + 1 or self.size].decode("utf-8")
+            for pos in self._line_starts(start)
+        )
+        return next(csv.reader(lines), [])
+
+    def _line_starts(self, pos: int) -> Iterator[int]:
+        while pos < self.size:
+            yield pos
+            pos = self.mm.find(b"\n", pos) + 1 or self.size
+
+    def split(self, count: int) -> List[Tuple[int, int]]:
+        """
+        Splits the data rows into at most count ranges of about the same number of bytes, cutting at the indexed rows.
+        The ranges are (start, end) byte offsets, so they can be read independently, including by other processes
+        """
+        if len(self.index) == 0:
+            return []
+        targets = numpy.linspace(self.index[0], self.size, count + 1)[1:-1]
+        cuts = self.index[
+            numpy.minimum(numpy.searchsorted(self.index, targets), len(self.index) - 1)
+        ]
+        bounds = [*numpy.unique([self.index[0], *cuts]).tolist(), self.size]
+        return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+    def sample_bytes(self, size: int) -> bytes:
+        """About size bytes, taken in a few pieces spread across the file"""
+        pieces = 4
+        step = max(self.size // pieces, 1)
+        return b"".join(
+            self.mm[pos : pos + size // pieces]  # noqa
+            for pos in range(0, self.size, step)
+        )
+
+
+class ForwardedSource(Source):
+    """
+    A Source over a gzip or bzip2 compressed CSV file. With raw_passthrough, the file is uploaded as it is,
+    so it only gets decompressed to read the header (and the rows, if something asks for them)
+    """
+
+    def __init__(self, path: str, compression: str) -> None:
+        self.path = path
+        opener = gzip.open if compression == "GZIP" else bz2.open
+        super().__init__(
+            opener(path, "rt", newline=""), size=os.path.getsize(path)  # type: ignore
+        )  # seeking to the end would decompress the whole file
+        self.compression = compression
+
+
+def index_rows(buffer: Any, stride: int) -> Tuple[int, numpy.ndarray, int, int]:
+    """
+    Indexes the CSV rows of a buffer with numpy, a block at a time so the temporary arrays stay small.
+    A newline only ends a row when an even number of quotes come before it.
+    Returns the end of the header, the start of every stride-th data line, the number of data lines, and how many of those aren't blank
+    """
+    data = numpy.frombuffer(buffer, dtype=numpy.uint8)
+    starts = []
+    quotes_open = 0
+    line_count = 0  # lines ended so far, including the header
+    blank_count = 0
+    prev_end = 0
+    for block_start in range(0, len(data), constants.READ_BLOCK_SIZE):
+        block = data[block_start : block_start + constants.READ_BLOCK_SIZE]  # noqa
+        quotes = numpy.flatnonzero(block == 34)  # "
+        newlines = numpy.flatnonzero(block == 10)  # \n
+        closed = (quotes_open + numpy.searchsorted(quotes, newlines)) % 2 == 0
+        quotes_open = (quotes_open + len(quotes)) % 2
+        ends = newlines[closed] + block_start + 1
+        if len(ends) == 0:
+            continue
+        line_numbers = numpy.arange(line_count, line_count + len(ends))
+        lengths = numpy.diff(ends, prepend=prev_end)
+        blank = (lengths == 1) | ((lengths == 2) & (data[ends - 2] == 13))  # \r\n
+        blank_count += int(blank[line_numbers > 0].sum())
+        starts.append(
+            ends[line_numbers % stride == 0]
+        )  # the end of line n is the start of data line n
+        line_count += len(ends)
+        prev_end = int(ends[-1])
+    if prev_end < len(data):  # the last line has no newline
+        line_count += 1
+    index = numpy.concatenate(starts) if starts else numpy.zeros(0, dtype=numpy.int64)
+    index = index[index < len(data)]
+    header_end = int(index[0]) if len(index) else len(data)
+    data_lines = max(line_count - 1, 0)
+    return header_end, index, data_lines, data_lines - blank_count
+
+
+def normalize_integer(x: str, bounds: Tuple[int, int]) -> Optional[int]:
+    """
+    Converts an integer string exactly, without going through float, so BIGINTs past 2**53 keep every digit.
+    A fraction of zeros (like 1.000) is dropped. Other fractions are truncated and exponents are expanded, like int(float(x)) did.
+    Raises a ValueError if the value is outside bounds
+    """
+    if x == "":
+        return None
+    if x.endswith(".0"):  # how pandas writes the integers in a float column
+        x = x[:-2]
+    try:
+        ret = int(x)
+    except ValueError:
+        whole, _, fraction = x.partition(".")
+        try:
+            ret = (
+                int(whole)
+                if fraction and not fraction.strip("0")
+                else int(decimal.Decimal(x))
+            )
+        except (ValueError, decimal.InvalidOperation):
+            raise ValueError(f"Could not convert '{x}' to an integer")
+    if not bounds[0] <= ret <= bounds[1]:
+        raise ValueError(
+            f"{ret} is outside the range of the column ({bounds[0]} to {bounds[1]})"
+        )
+    return ret
+
+
+SMALLINT_RANGE = type_classifiers.SMALLINT_RANGE
+INTEGER_RANGE = type_classifiers.INTEGER_RANGE
+BIGINT_RANGE = type_classifiers.BIGINT_RANGE
+
+
+def smallint_converter(x: str) -> Union[str, int, None]:
+    if x == "":
+        return None
+    if (
+        x.isdigit() and x.isascii() and len(x) < 5
+    ):  # the usual case. Values this short can't be out of range, so they're written as they are
+        return x
+    if x[0] == "-":
+        if x[1:].isdigit() and x.isascii() and len(x) < 6:
+            return x
+    elif x[-2:] == ".0":  # how pandas writes the integers in a float column
+        whole = x[:-2]
+        if whole.isdigit() and whole.isascii() and len(whole) < 5:
+            return whole
+    return normalize_integer(x, SMALLINT_RANGE)
+
+
+def integer_converter(x: str) -> Union[str, int, None]:
+    if x == "":
+        return None
+    if x.isdigit() and x.isascii() and len(x) < 10:
+        return x
+    if x[0] == "-":
+        if x[1:].isdigit() and x.isascii() and len(x) < 11:
+            return x
+    elif x[-2:] == ".0":
+        whole = x[:-2]
+        if whole.isdigit() and whole.isascii() and len(whole) < 10:
+            return whole
+    return normalize_integer(x, INTEGER_RANGE)
+
+
+def bigint_converter(x: str) -> Union[str, int, None]:
+    if x == "":
+        return None
+    if x.isdigit() and x.isascii() and len(x) < 19:
+        return x
+    if x[0] == "-":
+        if x[1:].isdigit() and x.isascii() and len(x) < 20:
+            return x
+    elif x[-2:] == ".0":
+        whole = x[:-2]
+        if whole.isdigit() and whole.isascii() and len(whole) < 19:
+            return whole
+    return normalize_integer(x, BIGINT_RANGE)
+
+
+def boolean_converter(x: str) -> Optional[bool]:
+    return str(x).lower() in ("1", "true") if x != "" else None
+
+
+def no_conversion(x: str) -> str:
+    return x
+
+
+def row_converter(conversions: List[Callable]) -> Callable[[List[str]], List[Any]]:
+    """
+    Builds a single function that converts a row for this schema. Only the columns that have a conversion are visited,
+    and their cells are replaced in place, so every other cell is left as it is without being copied.
+    Rows that aren't as wide as the schema take the general path, which converts as many cells as there are in both
+    """
+
+    def general(row: List[str]) -> List[Any]:
+        return [func(x) for func, x in zip(conversions, row)]
+
+    def convert(row: List[Any]) -> List[Any]:
+        if len(row) != width:
+            return general(row)
+        for i, func in converted:
+            row[i] = func(row[i])
+        return row
+
+    width = len(conversions)
+    converted = [
+        (i, func) for i, func in enumerate(conversions) if func is not no_conversion
+    ]
+    return convert
+
+
+CONVERTERS = {
+    "SMALLINT": smallint_converter,
+    "INTEGER": integer_converter,
+    "BIGINT": bigint_converter,
+    "BOOLEAN": boolean_converter,
+}
+
+
+def pad_rows(rows: Iterable[List[str]], width: int) -> Iterator[List[str]]:
+    """Skips blank rows and pads short rows with nulls up to the width"""
+    for row in rows:
+        if not row:
+            continue
+        if len(row) < width:
+            row += [""] * (width - len(row))
+        yield row
+
+
+def next_row_start(
+    text: str, pos: int, quotes: Tuple[int, int]
+) -> Tuple[int, Tuple[int, int]]:
+    """
+    Finds the start of the first CSV row at or after pos. A newline only ends a row when an even number of quotes come before it.
+    quotes is (the position quotes have been counted up to, the count), so the text is only counted once across calls.
+    Returns the start of the row (len(text) if there is none) and the new (position, count)
+    """
+    counted, count = quotes
+    pos = max(pos, counted)
+    while True:
+        pos = text.find("\n", pos)
+        if pos == -1:
+            return len(text), (counted, count)
+        count += text.count('"', counted, pos)
+        counted = pos
+        pos += 1
+        if count % 2 == 0:
+            return pos, (counted, count)
+
+
+def split_rows(text: str, start: int, count: int) -> List[Tuple[int, int]]:
+    """Splits text[start:] into at most count similarly sized, non-empty pieces made of whole CSV rows"""
+    bounds = [start]
+    quotes = (0, 0)
+    step = (len(text) - start) // count
+    for i in range(1, count):
+        pos, quotes = next_row_start(
+            text, start + i * step - 1, quotes
+        )  # a step that lands on a row start keeps it
+        if pos >= len(text):
+            break
+        if pos > bounds[-1]:
+            bounds.append(pos)
+    bounds.append(len(text))
+    return list(zip(bounds, bounds[1:]))
+
+
+def scan_rows(
+    rows: Iterable[List[str]],
+    inferences: List[Tuple[str, int, column_type_utilities.ColumnInference]],
+) -> int:
+    """
+    Narrows each (column name, position, inference) with the values in every row. Returns the number of rows.
+    A column stops being checked once no type fits it
+    """
+    row_count = 0
+    active = [(i, inference) for _, i, inference in inferences]
+    for row in rows:
+        row_count += 1
+        failed = [
+            x for x in active if not x[1].update(row[x[0]])
+        ]  # means that each one failed to parse at least one entry
+        if failed:
+            active = [x for x in active if x not in failed]
+    return row_count
+
+
+def sample_rows(
+    source: Source, upload_options: Dict
+) -> Optional[Tuple[List[List[str]], int]]:
+    """
+    Picks the rows used to infer the column types with infer_sample_rows/infer_sample_fraction: the first SAMPLE_HEAD_ROWS rows,
+    plus rows starting at random points of the source when it's in memory, or the first rows of random index blocks for a MappedSource
+    (otherwise the rows following the head).
+    Returns the rows and an estimate of the total row count, or None when the sample would cover about every row anyway
+    """
+    width = len(source.fieldnames)
+    rows = source.data_rows()
+    head = list(itertools.islice(rows, constants.SAMPLE_HEAD_ROWS + 1))
+    if len(head) <= constants.SAMPLE_HEAD_ROWS:
+        return None
+    if isinstance(source, MappedSource):  # the index already counted them
+        estimated_num_rows = source.num_rows
+    else:
+        row_size = sum(len(",".join(row)) + 2 for row in head) / len(head)
+        estimated_num_rows = max(math.ceil(source.size / row_size), len(head))
+    sample_size = max(
+        upload_options["infer_sample_rows"] or 0,
+        math.ceil((upload_options["infer_sample_fraction"] or 0) * estimated_num_rows),
+    )
+    if sample_size >= estimated_num_rows:
+        return None
+    sample_size -= len(head)
+    if sample_size <= 0:
+        return head, estimated_num_rows
+    if isinstance(source, MappedSource):
+        blocks = random.sample(
+            range(len(source.index)), min(sample_size, len(source.index))
+        )
+        block_rows = [source.row_at(block) for block in sorted(blocks)]
+        return head + list(pad_rows(block_rows, width)), estimated_num_rows
+    if not isinstance(source.source, io.StringIO):
+        return head + list(itertools.islice(rows, sample_size)), estimated_num_rows
+
+    text = source.source.getvalue()
+    header_end, quotes = next_row_start(text, 0, (0, 0))
+    starts = set()
+    for pos in sorted(
+        random.randrange(header_end, len(text)) for _ in range(sample_size)
+    ):  # sorted, so the quotes are only counted once
+        start, quotes = next_row_start(text, pos, quotes)
+        starts.add(start)
+    starts.discard(len(text))
+    sample: List[List[str]] = []
+    for start in sorted(starts):
+        end, _ = next_row_start(
+            text, start, (start, 0)
+        )  # no quotes are open at the start of a row
+        sample.extend(pad_rows(csv.reader(io.StringIO(text[start:end])), width))
+    return head + sample, estimated_num_rows
+
+
+def read_segment(segment: Any) -> str:
+    """A piece of CSV text, or a (path, start, end) byte range of a file, which is then read through mmap"""
+    if isinstance(segment, str):
+        return segment
+    path, start, end = segment
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return mm[start:end].decode("utf-8")
+
+
+def infer_segment(
+    args: Tuple[Any, int, List[Tuple[str, int, column_type_utilities.ColumnInference]]],
+) -> Tuple[int, List[Tuple[str, int, column_type_utilities.ColumnInference]]]:
+    """Runs scan_rows over a segment (see read_segment) in a worker process. Returns the row count and the narrowed inferences"""
+    segment, width, inferences = args
+    text = read_segment(segment)
+    row_count = scan_rows(
+        pad_rows(csv.reader(io.StringIO(text, newline="")), width), inferences
+    )
+    return row_count, inferences
+
+
+def compression_ratio(source: Source, upload_options: Dict) -> float:
+    """
+    Compresses a sample of the source with the chosen codec, to estimate how much smaller the chunks will be than the source
+    """
+    if isinstance(source, ForwardedSource):
+        return 1.0  # the size is already of the compressed file
+    sample = source.sample_bytes(constants.COMPRESSION_SAMPLE_SIZE)
+    if not sample:
+        return 1.0
+    compressed = compression_utilities.compress(
+        sample, upload_options["compression"], upload_options["compression_level"]
+    )
+    return len(compressed) / len(sample)
+
+
+def chunk_count_for(compressed_size: float, slice_count: int) -> int:
+    """
+    The number of files to split compressed_size bytes of chunks into. Each file gets about TARGET_CHUNK_SIZE bytes, and the count is
+    rounded up to a multiple of slice_count, so every slice loads the same number of files. When there's too little data to give every
+    slice a file of at least MIN_CHUNK_SIZE, as many files of at least that size are made as possible
+    """
+    count = max(1, math.ceil(compressed_size / constants.TARGET_CHUNK_SIZE))
+    sliced = math.ceil(count / slice_count) * slice_count
+    if compressed_size / sliced >= constants.MIN_CHUNK_SIZE:
+        return sliced
+    return max(1, min(sliced, int(compressed_size // constants.MIN_CHUNK_SIZE)))
+
+
+def write_chunk(
+    rows: Iterable[List[str]],
+    conversions: Optional[List[Callable]],
+    compression: str,
+    compression_level: Optional[int],
+) -> bytes:
+    """
+    Writes the rows as CSV and compresses them. Unless conversions is None, each value is first passed through its column's conversion (see row_converter).
+    The rows are written a block at a time into a reused buffer and fed to an incremental compressor, so the whole chunk is only ever held compressed
+    """
+    if conversions is not None:
+        rows = map(
+            row_converter(conversions), rows
+        )  # currently forcing 1.0, 2.0 -> 1, 2 and "true", "1" -> True, etc.
+    rows = iter(rows)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def blocks() -> Iterator[bytes]:
+        while True:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(itertools.islice(rows, constants.WRITE_BLOCK_ROWS))
+            if not buffer.tell():
+                return
+            yield buffer.getvalue().encode("utf-8")
+
+    return compression_utilities.compress_blocks(
+        blocks(), compression, compression_level
+    )  # only a block of rows is held uncompressed at a time
+
+
+def compress_range(
+    buffer: Any,
+    start: int,
+    end: int,
+    compression: str,
+    compression_level: Optional[int],
+) -> bytes:
+    """Compresses buffer[start:end] a block at a time, so the range is never copied out whole"""
+    blocks = (
+        buffer[pos : min(pos + constants.READ_BLOCK_SIZE, end)]  # noqa
+        for pos in range(start, end, constants.READ_BLOCK_SIZE)
+    )
+    return compression_utilities.compress_blocks(blocks, compression, compression_level)
+
+
+def build_chunk(
+    args: Tuple[Any, Optional[List[Callable]], str, Optional[int], bool],
+) -> bytes:
+    """
+    Builds a chunk in a worker process from a list of rows or a segment (see read_segment).
+    With raw, the segment's bytes are compressed without being parsed
+    """
+    segment, conversions, compression, compression_level, raw = args
+    if raw:
+        path, start, end = segment
+        with open(path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mm:
+            return compress_range(mm, start, end, compression, compression_level)
+    if isinstance(segment, list):
+        rows: Iterable[List[str]] = segment
+    else:
+        rows = csv.reader(io.StringIO(read_segment(segment), newline=""))
+    return write_chunk(rows, conversions, compression, compression_level)
+
+
+def build_chunks_in_parallel(tasks: Iterable[Tuple], processes: int) -> Iterator[bytes]:
+    """
+    Runs build_chunk over the tasks in a process pool and yields the chunks in order. Only twice as many tasks as processes are
+    submitted ahead of the chunk being yielded, so built chunks don't pile up in memory when they're consumed slowly.
+    The processes are spawned rather than forked, since the chunks are built while load_to_s3's upload threads are running,
+    and a fork would copy any lock those threads hold (in boto3 or logging, for example) in its locked state
+    """
+    log.debug(f"Building chunks in {processes} processes")
+    pending: collections.deque = collections.deque()
+    with multiprocessing.get_context("spawn").Pool(processes=processes) as pool:
+        for task in tasks:
+            pending.append(pool.apply_async(build_chunk, (task,)))
+            if len(pending) >= processes * 2:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def datetime_sort_key(pattern: Any) -> Callable[[str], Tuple[int, ...]]:
+    """
+    Orders dates, times, and timestamps by the value, since a day or hour doesn't need a leading zero.
+    The values must already have been checked against the type, so pattern matches every one of them
+    """
+
+    def key(x: str) -> Tuple[int, ...]:
+        match = pattern.fullmatch(x)
+        groups = match.groupdict()
+        ret = tuple(
+            int(groups[g]) for g in ("Y", "m", "d", "H", "M", "S") if g in groups
+        )
+        if groups.get("S") is None:
+            return ret
+        fraction = x[match.end("S") :].lstrip(".")  # noqa
+        return ret + (int(fraction.ljust(6, "0")),)
+
+    return key
+
+
+def utc_offset(z: str) -> int:
+    """
+    The microseconds a timezone offset like "+05", "-03:30", or "Z" is ahead of UTC
+    """
+    if z == "Z":
+        return 0
+    whole, _, fraction = z[1:].replace(":", "").partition(".")
+    whole = whole.ljust(6, "0")
+    ret = (int(whole[:2]) * 3600 + int(whole[2:4]) * 60 + int(whole[4:])) * 10 ** 6
+    ret += int(fraction.ljust(6, "0"))
+    return -ret if z[0] == "-" else ret
+
+
+def utc_sort_key(pattern: Any) -> Callable[[str], int]:
+    """
+    Orders timestamptz and timetz values by the UTC time they stand for, which is how Redshift compares them.
+    The values must already have been checked against the type, so pattern matches every one of them
+    """
+
+    def key(x: str) -> int:
+        match = pattern.fullmatch(x)
+        groups = match.groupdict()
+        seconds = int(groups["H"]) * 3600 + int(groups["M"]) * 60
+        fraction = ""
+        if groups["S"] is not None:
+            seconds += int(groups["S"])
+            fraction = x[match.end("S") : match.start("z")].lstrip(".")  # noqa
+        if groups.get("Y") is not None:
+            day = datetime.date(int(groups["Y"]), int(groups["m"]), int(groups["d"]))
+            seconds += day.toordinal() * 86400
+        micros = seconds * 10 ** 6 + int(fraction.ljust(6, "0"))
+        return micros - utc_offset(groups["z"])
+
+    return key
+
+
+def integer_sort_key(x: str) -> int:
+    ret = bigint_converter(x)
+    if ret is None:
+        raise ValueError  # only an empty value converts to None, and those go with the nulls
+    return int(ret)
+
+
+def float_sort_key(x: str) -> float:
+    ret = float(x)
+    if ret != ret:
+        raise ValueError  # NaN can't be ordered, so it goes with the nulls
+    return ret
+
+
+SORT_KEYS: Dict[str, Callable[[str], Any]] = {
+    "SMALLINT": integer_sort_key,
+    "INTEGER": integer_sort_key,
+    "BIGINT": integer_sort_key,
+    "DOUBLE PRECISION": float_sort_key,
+    "BOOLEAN": boolean_converter,
+    "DATE": datetime_sort_key(type_classifiers.DATE_RE),
+    "TIMESTAMP": datetime_sort_key(type_classifiers.TIMESTAMP_RE),
+    "TIMESTAMPTZ": utc_sort_key(type_classifiers.TIMESTAMPTZ_RE),
+    "TIME": datetime_sort_key(type_classifiers.TIME_RE),
+    "TIMETZ": utc_sort_key(type_classifiers.TIMETZ_RE),
+}  # types not in here are ordered by their text, like Redshift orders a VARCHAR
+
+
+def row_sort_key(position: int, col_type: str) -> Callable[[List[str]], Tuple]:
+    """
+    The key to order rows by the value in a column of the given type. Nulls (and anything else the type can't order) go last
+    """
+    value_key = SORT_KEYS.get(col_type, no_conversion)
+
+    def key(row: List[str]) -> Tuple:
+        x = row[position] if position < len(row) else ""
+        if x == "":
+            return (True,)
+        try:
+            return (False, value_key(x))
+        except (ValueError, TypeError, AttributeError):
+            return (True,)
+
+    return key
+
+
+def presort_rows(
+    rows: Iterable[List[str]], key: Callable[[List[str]], Tuple]
+) -> Iterator[List[str]]:
+    """
+    Sorts the rows with an external merge sort. Runs taking about PRESORT_RUN_SIZE bytes of memory are sorted in memory, and every run but the last
+    is spilled to a temporary CSV file. A row's size counts the list and str objects, not just the characters, since those take several times the space. The runs are then merged, so only a row from each run has to be held at once.
+    Both the sort and the merge are stable, so rows with the same key keep their order
+    """
+    rows = iter(rows)
+    with contextlib.ExitStack() as stack:
+        runs: List[Iterable[List[str]]] = []
+        while True:
+            run = []
+            size = 0
+            for row in rows:
+                run.append(row)
+                size += (
+                    sys.getsizeof(row)
+                    + sum(map(sys.getsizeof, row))
+                    + constants.PRESORT_KEY_SIZE
+                )
+                if size >= constants.PRESORT_RUN_SIZE:
+                    break
+            run.sort(key=key)
+            if size < constants.PRESORT_RUN_SIZE:  # the rows ran out
+                runs.append(run)
+                break
+            f = stack.enter_context(
+                tempfile.TemporaryFile(mode="w+", encoding="utf-8", newline="")
+            )
+            csv.writer(f).writerows(run)
+            f.seek(0)
+            runs.append(csv.reader(f))
+        if len(runs) > 1:
+            log.debug(f"Merging {len(runs)} sorted runs")
+        yield from heapq.merge(*runs, key=key)
+
 
 class CustomFormatter(logging.Formatter):
     FORMAT_STR = "%(asctime)s - %(levelname)s: %(message)s (%(filename)s:%(lineno)d)"
@@ -94,73 +875,264 @@ def initialize_logger(log_level: str) -> None:
     log.addHandler(handler)
 
 
-def chunkify(source: Source, upload_options: Dict) -> Tuple[List[bytes], int]:
+def sizes_chunks(source: Source, upload_options: Dict) -> bool:
+    """
+    Whether chunkify works out the chunk count itself (see chunk_count_for), which is the only use of node_count.
+    It doesn't when load_in_parallel is set, or when a compressed file is forwarded as a single chunk
+    """
+    if upload_options["load_in_parallel"]:
+        return False
+    return not (
+        upload_options["raw_passthrough"] and isinstance(source, ForwardedSource)
+    )
+
+
+def chunkify(
+    source: Source, upload_options: Dict
+) -> Tuple[Iterator[Tuple[int, constants.Chunk]], int]:
     """
-    Breaks the single file into multiple smaller chunks to speed loading into S3 and copying into Redshift
+    Breaks the single file into multiple smaller chunks to speed loading into S3 and copying into Redshift.
+    The chunks are generated lazily as (index, chunk) pairs, so only the chunks currently being uploaded need to be held in memory.
+    A MappedSource or in-memory source is split into ranges of about the same size, so each chunk is read straight from its part of the source.
+    Unless load_in_parallel is set, the chunk count comes from the source size and the compression ratio measured on a sample of it (see chunk_count_for).
+    The chunks are compressed with the codec in upload_options["compression"].
+    With chunk_in_parallel, the chunks are built in a process pool, one chunk per task. Chunks being checked against sampled column types
+    are still built one at a time, since each check can change how the following chunks are written.
+    With raw_passthrough, those byte ranges are compressed without being parsed, and a compressed file is a single chunk, uploaded straight from the file (see constants.LocalFile).
+    With presort, the rows are sorted by the sortkey column first (see presort_rows), and the sorted rows are split by row counts.
+    If the column types were inferred from a sample, every row is checked as the chunks are built. When that widens a column in a way
+    that changes how its values are written, the chunks written before the change are generated again at the end
     """
 
     def ideal_load_count() -> int:
         if upload_options["load_in_parallel"]:
             return upload_options["load_in_parallel"]
-        # sort of arbitrary tbh. Really should be breaking it into 1GB chunks, but don't know how to do that efficiently & in parallel
-
         # https://docs.aws.amazon.com/redshift/latest/dg/c_best-practices-use-multiple-files.html
-        # We're dividing by 70% because the BZIP2 seems to compress things by 30% and we are sending the compressed blobs, but currently working with the uncompressed data
-        min_s3_size = 1 * 1024 ** 2 / 0.7  # 1   MB
-        max_s3_size = 125 * 1024 ** 2 / 0.7  # 125 BB
-
-        min_slices = int(source.size // max_s3_size)
-        max_slices = int(source.size // min_s3_size)
-
-        # Slicing protocol:
-        # Suppose we have a file of n bytes
-        # 1. If we have more than max_s3_size of data, we split it into the largest of:
-        #   a. the greatest multiple of node_count less than (n // max_s3_size)
-        #   b. node_count
-        # 2. If we have more than min_s3_size of data, we split it into the largest of:
-        #   a. the greatest multiple of node_count less than (n // min_s3_size)
-        #   b. node_count
-        # 3. Otherwise, we have a single chunk
-
-        if min_slices > 0:
-            min_slices -= min_slices % upload_options["node_count"]
-            return max(min_slices, upload_options["node_count"])
-        elif max_slices > 0:
-            max_slices -= max_slices % upload_options["node_count"]
-            return max(max_slices, upload_options["node_count"])
-        else:
-            return 1
-
-    def chunk_to_string(chunk: List[str]) -> bytes:
-        buffer = io.StringIO()
-        writer = csv.writer(buffer)
-        writer.writerows(chunk)
-        buffer.seek(0)
-        compressed = bz2.compress(buffer.read().encode("utf-8"))
-        return compressed
-
-    col_conversions = [
-        col.get("converter_func", lambda x: x) for col in source.column_types.values()
-    ]
-    rows = list(source.rows())[1:]  # the first is the header
-    if not upload_options[
-        "skip_checks"
-    ]:  # necessary because with skip_checks, there are no column_types, so the zip returns a iterator with length 0.
-        rows = [
-            [func(x) for func, x in zip(col_conversions, row)] for row in rows
-        ]  # currently forcing 1.0, 2.0 -> 1, 2 and "true", "1" -> True, etc.
+        # The files should be 1MB-1GB after compression, and there should be a multiple of the slice count of them.
+        # How much the chunks shrink depends a lot on the codec and the data, so it's measured on a sample of the source
+        compressed_size = source.size * compression_ratio(source, upload_options)
+        return chunk_count_for(compressed_size, upload_options["node_count"] or 1)
+
+    def conversions(col_conversions: List[Callable]) -> Optional[List[Callable]]:
+        if upload_options[
+            "skip_checks"
+        ]:  # necessary because with skip_checks, there are no column_types, so the zip returns a iterator with length 0.
+            return None
+        return col_conversions
+
+    def chunk_to_string(
+        chunk: Iterable[List[str]], col_conversions: List[Callable]
+    ) -> bytes:
+        return write_chunk(
+            chunk,
+            conversions(col_conversions),
+            upload_options["compression"],
+            upload_options["compression_level"],
+        )
+
+    def build_in_parallel(
+        segments: Iterable[Any], col_conversions: List[Callable], raw: bool
+    ) -> Iterator[Tuple[int, bytes]]:
+        tasks = (
+            (
+                segment,
+                conversions(col_conversions),
+                upload_options["compression"],
+                upload_options["compression_level"],
+                raw,
+            )
+            for segment in segments
+        )
+        yield from enumerate(build_chunks_in_parallel(tasks, processes))
+
+    def segments() -> Iterable[Any]:
+        if ranges is None:
+            return (list(chunk) for chunk in read_chunks())
+        if isinstance(source, MappedSource):
+            return ((source.path, start, end) for start, end in ranges)
+        text = source.source.getvalue()
+        return (
+            text[start:end] for start, end in ranges
+        )  # the processes parse the rows themselves
+
+    def chunk_rows(rows: Iterator[List[str]], i: int) -> Iterator[List[str]]:
+        return itertools.islice(
+            rows, chunk_size if i < chunk_count - 1 else None
+        )  # the last chunk takes whatever is left
+
+    def read_chunks() -> Iterator[Iterator[List[str]]]:
+        if ranges is not None:
+            for start, end in ranges:
+                yield source.rows_in(start, end)
+            return
+        rows = source.rows()
+        next(rows, None)  # the first is the header
+        if sort_key is not None:
+            rows = presort_rows(rows, sort_key)
+        for i in range(chunk_count):
+            yield chunk_rows(rows, i)
+
+    def reread_chunks(stale: List[int]) -> Iterator[Tuple[int, Iterator[List[str]]]]:
+        if ranges is not None:
+            for i in stale:
+                yield i, source.rows_in(*ranges[i])
+            return
+        for i, chunk in enumerate(read_chunks()):
+            if i > stale[-1]:
+                return
+            if i in stale:
+                yield i, chunk
+            else:
+                collections.deque(chunk, maxlen=0)  # skips the chunk
+
+    def forward_file(path: str) -> Iterator[Tuple[int, constants.Chunk]]:
+        yield 0, constants.LocalFile(
+            path
+        )  # streamed from the file by the upload, so it's never read into memory
+
+    def gen_raw_chunks(
+        mapped: MappedSource, ranges: List[Tuple[int, int]]
+    ) -> Iterator[Tuple[int, bytes]]:
+        if processes > 1:
+            yield from build_in_parallel(
+                ((mapped.path, start, end) for start, end in ranges), [], raw=True
+            )
+            return
+        for i, (start, end) in enumerate(ranges):
+            yield i, compress_range(
+                mapped.mm,
+                start,
+                end,
+                upload_options["compression"],
+                upload_options["compression_level"],
+            )
+
+    def gen_chunks() -> Iterator[Tuple[int, bytes]]:
+        col_conversions = [
+            col.get("converter_func", no_conversion)
+            for col in source.column_types.values()
+        ]
+        if processes > 1:
+            yield from build_in_parallel(segments(), col_conversions, raw=False)
+            return
+        for i, chunk in enumerate(read_chunks()):
+            yield i, chunk_to_string(chunk, col_conversions)
+
+    def gen_validated_chunks(inferences: List) -> Iterator[Tuple[int, bytes]]:
+        written_with = []
+        row_count = 0
+        for i, chunk in enumerate(read_chunks()):
+            rows = list(chunk)
+            row_count += scan_rows(pad_rows(rows, len(source.fieldnames)), inferences)
+            col_conversions = validated_conversions(source, inferences)
+            written_with.append(col_conversions)
+            yield i, chunk_to_string(rows, col_conversions)
+        source.num_rows = row_count
+        source.unvalidated = None
+
+        stale = [i for i, x in enumerate(written_with) if x != col_conversions]
+        if stale:
+            log.info(
+                f"Rewriting {len(stale)} chunks, since the sampled column types had to be widened"
+            )
+            for i, chunk in reread_chunks(stale):
+                yield i, chunk_to_string(chunk, col_conversions)
+
+    if upload_options["raw_passthrough"] and isinstance(source, ForwardedSource):
+        return (
+            forward_file(source.path),
+            1,
+        )  # COPY reads the file as it is, header included
+    if upload_options["raw_passthrough"] and isinstance(source, MappedSource):
+        load_in_parallel = ideal_load_count()
+        processes = min(upload_options["chunk_in_parallel"] or 1, load_in_parallel)
+        return (
+            gen_raw_chunks(source, source.split(load_in_parallel)),
+            load_in_parallel,
+        )  # the ranges start after the header and end on row boundaries, so the bytes can be compressed as they are
+
     load_in_parallel = ideal_load_count()
-    chunk_size = math.ceil(source.num_rows / load_in_parallel)
+    sort_key = presort_key(source, upload_options)
+    ranges = (
+        source.split(load_in_parallel) if sort_key is None else None
+    )  # ranges of about the same size, so a chunk can be read without reading the ones before it
+    if ranges is not None:
+        chunk_count = len(ranges)
+    else:  # the source can only be read from the start, so it's split by row counts
+        row_estimate = source.estimated_num_rows
+        if (
+            source.unvalidated is None or row_estimate is None
+        ):  # without a sample to estimate from, the rows are counted
+            row_estimate = source.num_rows
+        chunk_size = max(math.ceil(row_estimate / load_in_parallel), 1)
+        chunk_count = math.ceil(row_estimate / chunk_size)
+    processes = min(upload_options["chunk_in_parallel"] or 1, chunk_count)
+    if source.unvalidated is not None:
+        return gen_validated_chunks(source.unvalidated), load_in_parallel
+    return gen_chunks(), load_in_parallel
+
+
+def presort_key(source: Source, upload_options: Dict) -> Optional[Callable]:
+    """
+    The key to presort the rows by, or None when they're uploaded in the order they're read
+    """
+    if not upload_options["presort"]:
+        return None
+    sortkey = upload_options["sortkey"]
+    if sortkey not in source.fieldnames:
+        log.warning(
+            f"The sortkey {sortkey} isn't a column of the source, so the rows can't be presorted"
+        )
+        return None
+    return row_sort_key(
+        source.fieldnames.index(sortkey),
+        source.column_types.get(sortkey, {}).get("type", "VARCHAR"),
+    )
+
+
+def log_predefined_failures(source: Source, failed_cols: List[str]) -> None:
+    """
+    Logs the values that don't match the type of any failed column that was predefined (see get_bad_vals)
+    """
+    for col in failed_cols:
+        if (
+            col in source.predefined_columns
+        ):  # means that the new data doesn't match the old
+            get_bad_vals(
+                source.dictrows(),
+                col,
+                [
+                    x
+                    for x in column_type_utilities.get_possible_data_types()
+                    if x["type"] == source.predefined_columns[col]["type"]
+                ][0],
+            )  # TODO: iterate over rows just once, rather than once per bad col
+
+
+def validated_conversions(source: Source, inferences: List) -> List[Callable]:
+    """
+    Updates the column types of the source from inferences that are still being checked, and returns the conversion for each column.
+    Raises a ValueError if a column no longer matches any type
+    """
+    non_viable_cols = [col for col, _, inference in inferences if not inference.viable]
+    if non_viable_cols:
+        log_predefined_failures(source, non_viable_cols)
+        log.error(
+            f"The following columns could not be parsed: {', '.join(non_viable_cols)}. Aborting now"
+        )
+        raise ValueError("Some columns could not match to a valid Redshift column type")
+    for col, _, inference in inferences:
+        source.column_types[col] = inference.column_type()
     return [
-        chunk_to_string(rows[offset : (offset + chunk_size)])  # noqa
-        for offset in range(0, source.num_rows, chunk_size)
-    ], load_in_parallel
+        CONVERTERS.get(col["type"], no_conversion)
+        for col in source.column_types.values()
+    ]
 
 
 def load_source(source: constants.SourceOptions, upload_options: Dict = None) -> Source:
     """
     Loads/transforms the source data to simplify data handling for the rest of the program.
-    Accepts a DataFrame, a csv.reader, a list, or a path to a csv/xlsx file.
+    Accepts a DataFrame, a csv.reader, a list, or a path to a csv/xlsx file. Paths ending in .csv.gz or .csv.bz2 are read as compressed CSVs.
     source_args and source_kwargs both get passed to the csv.reader, pandas.read_excel, and pandas.read_csv functions
     """
     if upload_options is None:
@@ -199,13 +1171,22 @@ def load_source(source: constants.SourceOptions, upload_options: Dict = None) ->
         log.debug(
             "If you have a CSV that happens to end with .csv, this will treat it as a path. This is a reason all files ought to end with a newline"
         )
+        for extension, compression in constants.COMPRESSED_SOURCES.items():
+            if source.endswith(extension):
+                return ForwardedSource(source, compression)
         if source.endswith(".csv"):
+            if (
+                upload_options["stream_from_file"] or upload_options["raw_passthrough"]
+            ) and os.path.getsize(source) > 0:
+                return MappedSource(source)  # an empty file can't be mapped
             f_in = open(source, "r")
             if upload_options["stream_from_file"]:
                 return Source(f_in)
             else:
                 f_out = io.StringIO()  # we need to load the file in memory
-                f_out.write(f_in.read())
+                shutil.copyfileobj(
+                    f_in, f_out
+                )  # copies in blocks, so we never hold a second full copy of the file as a str
                 f_in.close()
                 return Source(f_out)
 
@@ -225,12 +1206,47 @@ def load_source(source: constants.SourceOptions, upload_options: Dict = None) ->
 
     elif isinstance(source, pandas.DataFrame):
         f = io.StringIO()
-        source.to_csv(f, index=False)
-        return Source(f)
+        if isinstance(
+            source.columns, pandas.MultiIndex
+        ):  # those get multiple header rows, so the columns don't line up with the fieldnames
+            source.to_csv(f, index=False)
+            return Source(f)
+        integral_floats(source).to_csv(f, index=False)
+        ret = Source(f)
+        ret.frame = (
+            source  # the original dtypes, so a float column is still typed as one
+        )
+        return ret
 
     raise ValueError("We do not support this type of source")
 
 
+def integral_floats(frame: pandas.DataFrame) -> pandas.DataFrame:
+    """
+    Casts the float columns holding only whole numbers to nullable integers, checking a whole column at a time.
+    to_csv then writes 12 instead of 12.0, so loading them into an integer column doesn't have to strip the fraction from every value
+    """
+    casts = {}
+    for position in range(frame.shape[1]):
+        series = frame.iloc[:, position]
+        if series.dtype.kind != "f":
+            continue
+        values = series.to_numpy()
+        values = values[~numpy.isnan(values)]
+        if (
+            len(values)
+            and (numpy.abs(values) < 2 ** 63).all()
+            and (values == numpy.trunc(values)).all()
+        ):
+            casts[position] = "Int64"
+    if not casts:
+        return frame
+    ret = frame.copy(deep=False)
+    for position, dtype in casts.items():
+        ret.isetitem(position, ret.iloc[:, position].astype(dtype))
+    return ret
+
+
 def get_bad_vals(rows: Iterator[Dict], col: str, type_info: Dict, top: int = 5):
     """
     An error logging function to identify the first n values in a column that don't match the predefined type of the column
@@ -252,15 +1268,84 @@ def get_bad_vals(rows: Iterator[Dict], col: str, type_info: Dict, top: int = 5):
         log.error("There are no other bad values for this column")
 
 
+def frame_inference(
+    frame: pandas.DataFrame, position: int, candidates: List[Dict]
+) -> Optional[column_type_utilities.ColumnInference]:
+    """
+    Infers the type of a DataFrame column without reading it back from the CSV.
+    Typed columns use their dtype. Columns holding only strings are checked directly, since to_csv writes them unchanged.
+    Returns None for anything else
+    """
+    series = frame.iloc[:, position]
+    inference = column_type_utilities.ColumnInference.from_dtype(series, candidates)
+    if inference is None and pandas.api.types.infer_dtype(series, skipna=True) in (
+        "string",
+        "empty",
+    ):
+        inference = column_type_utilities.ColumnInference.from_column(
+            series.to_numpy(dtype=object, na_value=""), candidates
+        )
+    return inference
+
+
+def infer_in_parallel(
+    source: Source,
+    inferences: List[Tuple[str, int, column_type_utilities.ColumnInference]],
+    processes: int,
+) -> int:
+    """
+    Splits the source into pieces of whole rows and runs scan_rows on each in a process pool. The pieces of a MappedSource are byte ranges,
+    so only the offsets are sent to the processes.
+    The inferences of the pieces are merged back into inferences. Returns the number of rows
+    """
+    count = min(processes, max(1, source.size // constants.MIN_INFER_SEGMENT_SIZE))
+    ranges = source.split(count) or []
+    if isinstance(source, MappedSource):
+        segments: Iterable = (
+            (source.path, start, end) for start, end in ranges
+        )  # each process reads its own range of the file
+    else:
+        text = source.source.getvalue() if ranges else ""
+        segments = (text[start:end] for start, end in ranges)
+    if len(ranges) <= 1:
+        return scan_rows(source.data_rows(), inferences)
+
+    log.debug(f"Inferring column types in {len(ranges)} processes")
+    width = len(source.fieldnames)
+    row_count = 0
+    with multiprocessing.Pool(processes=len(ranges)) as pool:
+        for segment_count, segment_inferences in pool.imap_unordered(
+            infer_segment,
+            ((segment, width, inferences) for segment in segments),
+        ):
+            row_count += segment_count
+            for (_, _, inference), (_, _, segment_inference) in zip(
+                inferences, segment_inferences
+            ):
+                inference.merge(segment_inference)
+    return row_count
+
+
 def fix_column_types(
-    source: Source, interface: redshift.Interface, drop_table: bool
+    source: Source,
+    interface: redshift.Interface,
+    drop_table: bool,
+    upload_options: Optional[Dict] = None,
 ) -> None:  # check what happens to the dict over multiple uses
     """
     Verifies the column names are not too long.
     Verifies the column data matches any predefined types.
+    Counts the rows of the source, so the row count, types and varchar widths all come from a single read.
     Generates an appropriate type for undefined columns.
     If varchars are longer than acceptable for the remote, expands the column
+    With the columnar_inference option, the types are inferred a whole column at a time instead of row by row.
+    With the infer_in_parallel option, the rows are split between that many processes
+    When the source is a DataFrame, typed columns get their types from the dtypes and string columns skip the CSV parsing.
+    Only the columns left over are read from the CSV.
+    With infer_sample_rows/infer_sample_fraction, the remaining types come from a sample and the rest of the rows are checked by chunkify
     """
+    if upload_options is None:
+        upload_options = constants.UPLOAD_DEFAULTS
 
     def clean_column(col: str, i: int, cols: List[str]) -> str:
         col_count = cols[:i].count(col)
@@ -287,27 +1372,84 @@ def fix_column_types(
                 x for x in col_types[col] if x["type"] == col_info["type"]
             ]
 
-    non_viable_cols = []
-    for row in source.dictrows():
-        for col, data in col_types.items():
-            viable_types = [x for x in data if x["func"](row[col], x)]
-            if (
-                not viable_types
-            ):  # means that each one failed to parse at least one entry
-                if (
-                    col in source.predefined_columns
-                ):  # means that the new data doesn't match the old
-                    get_bad_vals(
-                        source.dictrows(),
-                        col,
-                        [
-                            x
-                            for x in column_type_utilities.get_possible_data_types()
-                            if x["type"] == source.predefined_columns[col]["type"]
-                        ][0],
-                    )  # TODO: iterate over rows just once, rather than once per bad col
-                non_viable_cols.append(col)
-            col_types[col] = viable_types
+    def report_failures(failed_cols: List[str]) -> None:
+        log_predefined_failures(source, failed_cols)
+        non_viable_cols.extend(failed_cols)
+
+    column_index = {
+        col: i for i, col in enumerate(source.fieldnames)
+    }  # like csv.DictReader, the last of any duplicated column names wins
+    non_viable_cols: List[str] = []
+    column_order = {col: i for i, col in enumerate(col_types)}
+    settled: List[Tuple[str, int, column_type_utilities.ColumnInference]] = []
+    if source.frame is not None:
+        frame_inferences = [
+            (
+                col,
+                column_index[col],
+                frame_inference(source.frame, column_index[col], data),
+            )
+            for col, data in col_types.items()
+        ]
+        settled = [
+            (col, i, inference)
+            for col, i, inference in frame_inferences
+            if inference is not None
+        ]
+        report_failures([col for col, _, inference in settled if not inference.viable])
+        col_types = {
+            col: col_types[col]
+            for col, _, inference in frame_inferences
+            if inference is None
+        }  # the rest need the CSV
+
+    if source.frame is not None and not col_types:
+        inferences = []
+        row_count = len(source.frame)
+    elif upload_options["columnar_inference"]:
+        columns = source.columns()
+        inferences = [
+            (
+                col,
+                column_index[col],
+                column_type_utilities.ColumnInference.from_column(
+                    columns[column_index[col]], data
+                ),
+            )
+            for col, data in col_types.items()
+        ]
+        row_count = len(columns[0]) if columns else 0
+        report_failures(
+            [col for col, _, inference in inferences if not inference.viable]
+        )
+    else:
+        inferences = [
+            (col, column_index[col], column_type_utilities.ColumnInference(data))
+            for col, data in col_types.items()
+        ]
+        sample = None
+        if (
+            upload_options["infer_sample_rows"]
+            or upload_options["infer_sample_fraction"]
+        ):
+            sample = sample_rows(source, upload_options)
+        if sample is not None:
+            rows, source.estimated_num_rows = sample
+            log.info(f"Inferring the column types from a sample of {len(rows)} rows")
+            scan_rows(rows, inferences)
+            source.unvalidated = inferences
+            row_count = None  # counted when chunkify checks the rest
+        elif upload_options["infer_in_parallel"]:
+            row_count = infer_in_parallel(
+                source, inferences, upload_options["infer_in_parallel"]
+            )
+        else:
+            row_count = scan_rows(
+                source.data_rows(), inferences
+            )  # counting here saves Source a separate pass over the data
+        report_failures(
+            [col for col, _, inference in inferences if not inference.viable]
+        )
 
     if non_viable_cols:
         log.error(
@@ -315,16 +1457,27 @@ def fix_column_types(
         )
         raise ValueError("Some columns could not match to a valid Redshift column type")
 
+    if row_count is not None:
+        source.num_rows = row_count
     source.column_types = {
-        k: v[0] for k, v in col_types.items()
+        col: inference.column_type()
+        for col, _, inference in sorted(
+            settled + inferences, key=lambda x: column_order[x[0]]
+        )
     }  # we want the most specialized possible type for each column
+    finish_column_types(source, interface, drop_table)
+
+
+def finish_column_types(
+    source: Source, interface: redshift.Interface, drop_table: bool
+) -> None:
+    """
+    Sets the conversion used when writing each column, and expands any varchar columns of the remote table that are too narrow.
+    Runs again once the rest of the rows have been checked when the types were inferred from a sample
+    """
     for colname, col_info in source.column_types.items():
-        if col_info["type"] in ("SMALLINT", "INTEGER", "BIGINT"):
-            col_info["converter_func"] = lambda x: int(float(x)) if x != "" else None
-        if col_info["type"] == "BOOLEAN":
-            col_info["converter_func"] = (
-                lambda x: str(x).lower() in ("1", "true") if x != "" else None
-            )
+        if col_info["type"] in CONVERTERS:
+            col_info["converter_func"] = CONVERTERS[col_info["type"]]
         elif (
             col_info["type"] == "VARCHAR"
             and interface.table_exists
@@ -356,6 +1509,16 @@ def check_coherence(
     At most one of truncate_table and drop_table can be set to True
     redshift_username, redshift_password, access_key, secret_key, bucket, host, dbname, port must all be set
     You cannot both skip_checks and drop_table, since we need to calculate the column types when recreating the table. Note: if skip_checks is True and the table doesn't exist yet, the program will raise a ValueError when it checks for the table's existence
+    You cannot both stream_from_file and use columnar_inference, since the columnar view holds the whole source in memory
+    infer_in_parallel must be None or a positive integer, and can't be combined with columnar_inference
+    infer_sample_rows must be an integer and infer_sample_fraction must be in (0, 1]. Sampling can't be combined with columnar_inference or infer_in_parallel
+    raw_passthrough requires skip_checks, since the rows are never parsed
+    chunk_in_parallel, upload_queue_size, node_count, memory_budget, and multipart_threshold must be None or positive integers
+    multipart_chunksize must be an integer of at least 5MB, and multipart_concurrency a positive integer
+    compression must be a known codec that can be used on this machine, and compression_level must be None or a level that codec accepts
+    cleanup_s3 must be True, False, or "background"
+    s3_backend must be "threads" or "asyncio". The asyncio backend needs aiobotocore and doesn't support memory_budget
+    presort requires a sortkey and the column types, so it can't be combined with skip_checks, raw_passthrough, or sampling
     """
     upload_options = {**constants.UPLOAD_DEFAULTS, **(upload_options or {})}
     aws_info = aws_info or {}
@@ -391,6 +1554,106 @@ def check_coherence(
             "If you're dropping the table, you need the checks to determine what column types to use"
         )
 
+    if upload_options["columnar_inference"] and upload_options["stream_from_file"]:
+        raise ValueError(
+            "The columnar_inference option loads the whole source into memory, so it can't be used with stream_from_file"
+        )
+
+    if upload_options["infer_in_parallel"] is not None:
+        if (
+            not isinstance(upload_options["infer_in_parallel"], int)
+            or upload_options["infer_in_parallel"] < 1
+        ):
+            raise ValueError("The option infer_in_parallel must be a positive integer")
+        if upload_options["columnar_inference"]:
+            raise ValueError(
+                "The infer_in_parallel option splits up the row by row inference, so it can't be used with columnar_inference"
+            )
+
+    if (
+        upload_options["infer_sample_rows"] is not None
+        and not isinstance(upload_options["infer_sample_rows"], int)
+    ) or (
+        upload_options["infer_sample_fraction"] is not None
+        and not 0 < upload_options["infer_sample_fraction"] <= 1
+    ):
+        raise ValueError(
+            "The option infer_sample_rows must be an integer and infer_sample_fraction must be between 0 and 1"
+        )
+    if (
+        upload_options["infer_sample_rows"] or upload_options["infer_sample_fraction"]
+    ) and (upload_options["columnar_inference"] or upload_options["infer_in_parallel"]):
+        raise ValueError(
+            "Sampling replaces the full type scan, so it can't be combined with columnar_inference or infer_in_parallel"
+        )
+
+    for c in [
+        "chunk_in_parallel",
+        "upload_queue_size",
+        "node_count",
+        "memory_budget",
+        "multipart_threshold",
+    ]:
+        if upload_options[c] is not None and (
+            not isinstance(upload_options[c], int) or upload_options[c] < 1
+        ):
+            raise ValueError(f"The option {c} must be a positive integer")
+
+    if (
+        not isinstance(upload_options["multipart_chunksize"], int)
+        or upload_options["multipart_chunksize"] < constants.MIN_MULTIPART_CHUNKSIZE
+    ):
+        raise ValueError(
+            "The option multipart_chunksize must be an integer of at least 5MB, since S3 rejects smaller parts"
+        )
+    if (
+        not isinstance(upload_options["multipart_concurrency"], int)
+        or upload_options["multipart_concurrency"] < 1
+    ):
+        raise ValueError("The option multipart_concurrency must be a positive integer")
+
+    if upload_options["raw_passthrough"] and not upload_options["skip_checks"]:
+        raise ValueError(
+            "The raw_passthrough option uploads the file without reading its rows, so it needs skip_checks"
+        )
+
+    compression_utilities.check_codec(
+        upload_options["compression"], upload_options["compression_level"]
+    )
+
+    if upload_options["cleanup_s3"] not in (True, False, "background"):
+        raise ValueError(
+            f'The option cleanup_s3 must be True, False, or "background". Currently it is set to "{upload_options["cleanup_s3"]}"'
+        )
+
+    if upload_options["s3_backend"] not in ("threads", "asyncio"):
+        raise ValueError(
+            f'The option s3_backend must be "threads" or "asyncio". Currently it is set to "{upload_options["s3_backend"]}"'
+        )
+    if upload_options["s3_backend"] == "asyncio":
+        missing = redshift.aiobotocore_missing()
+        if missing:
+            raise ValueError(missing)
+        if upload_options["memory_budget"] is not None:
+            raise ValueError(
+                "The asyncio s3_backend doesn't spill chunks to disk, so it can't be combined with memory_budget"
+            )
+
+    if upload_options["presort"]:
+        if not upload_options["sortkey"]:
+            raise ValueError("The presort option needs a sortkey to sort the rows by")
+        if upload_options["skip_checks"] or upload_options["raw_passthrough"]:
+            raise ValueError(
+                "The presort option orders the rows by the type of the sortkey column, so it can't be combined with skip_checks or raw_passthrough"
+            )
+        if (
+            upload_options["infer_sample_rows"] is not None
+            or upload_options["infer_sample_fraction"] is not None
+        ):
+            raise ValueError(
+                "A sampled column type can still change while the chunks are written, so presort can't be combined with infer_sample_rows or infer_sample_fraction"
+            )
+
     for c in ["default_timeout", "lock_timeout"]:
         if not isinstance(upload_options[c], int):
             raise ValueError(
@@ -2,21 +2,57 @@ import json
 import os
 import toposort  # type: ignore
 import datetime
+import boto3.s3.transfer  # type: ignore
 import psycopg2  # type: ignore
 import psycopg2.sql  # type: ignore
-from typing import Dict, List, Union
+import asyncio
+import concurrent.futures
+from typing import Dict, Iterable, List, Union
 
 try:
-    import base_utilities, local_utilities  # type: ignore
+    import base_utilities, local_utilities, compression_utilities, constants  # type: ignore
     from db_interfaces import redshift  # type: ignore
 except ModuleNotFoundError:
-    from . import base_utilities, local_utilities
+    from . import base_utilities, local_utilities, compression_utilities, constants
     from .db_interfaces import redshift  # type: ignore
 import logging
 
 log = logging.getLogger("redshift_utilities")
 
 
+def transfer_config(upload_options: Dict) -> boto3.s3.transfer.TransferConfig:
+    """
+    The managed transfer settings for the chunk uploads. Without a multipart_threshold, only chunks too large for a single request are split
+    """
+    return boto3.s3.transfer.TransferConfig(
+        multipart_threshold=upload_options["multipart_threshold"]
+        or constants.MAX_PUT_SIZE,
+        multipart_chunksize=upload_options["multipart_chunksize"],
+        max_concurrency=upload_options["multipart_concurrency"],
+    )
+
+
+def run_async_upload(
+    interface: redshift.Interface, sources: Iterable, upload_options: Dict
+) -> None:
+    """
+    Runs Interface.load_to_s3_async to completion. asyncio.run can't start a loop in a thread that already has one running
+    (a notebook, or a caller that's a coroutine itself), so there the upload gets its own loop on a worker thread.
+    The caller's loop is blocked until the upload is done either way. Coroutines can await Interface.load_to_s3_async directly instead
+    """
+    coroutine = interface.load_to_s3_async(
+        sources, upload_options["upload_queue_size"], transfer_config(upload_options)
+    )
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        asyncio.run(coroutine)
+        return
+    log.debug("An event loop is already running, so the upload runs on a worker thread")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(asyncio.run, coroutine).result()
+
+
 def log_dependent_views(interface: redshift.Interface) -> None:
     """
     Gets dependent views and saves them locally for reinstantiation after table is regenerated.
@@ -180,7 +216,18 @@ def s3_to_redshift(
         .as_string(cursor)
         for col_name in column_types.keys()
     ]
-    interface.copy_table(cursor, formatted_cols)
+    if upload_options["raw_passthrough"] and source.compression:
+        interface.copy_table(
+            cursor, formatted_cols, compression=source.compression, header_rows=1
+        )  # the file was uploaded as it is, header and all
+    else:
+        interface.copy_table(
+            cursor,
+            formatted_cols,
+            compression=compression_utilities.CODECS[
+                upload_options["compression"]
+            ].copy_keyword,
+        )
 
     # we can't ensure the grant permissions have changed, so we always do it in case
     if upload_options["grant_access"]:
@@ -0,0 +1,360 @@
+import numpy
+import re
+from typing import Dict, Optional
+
+# The patterns mirror the ones datetime.strptime builds for the formats these classifiers used to try, so the same strings are accepted.
+# The one addition is a fractional second after a ".", since that is how Redshift and pandas write them.
+# Ranges the patterns can't express (days in a month, leap seconds, offsets over a day) are checked on the match, without raising anything
+_DATE = r"(?P<Y>\d\d\d\d)-(?P<m>1[0-2]|0[1-9]|[1-9])-(?P<d>3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9])"
+_TIME = r"(?P<H>2[0-3]|[0-1]\d|\d):(?P<M>[0-5]\d|\d)"
+_SECONDS = r":(?P<S>6[0-1]|[0-5]\d|\d)"
+_FRACTION = r"\.?\d{1,6}"
+_TZ = r"(?P<z>[+-](?P<zH>\d\d)(?::[0-5]\d(?::[0-5]\d(?:\.\d{1,6})?)?|[0-5]\d(?:[0-5]\d(?:\.\d{1,6})?)?)|Z)"
+
+DATE_RE = re.compile(_DATE)
+TIMESTAMP_RE = re.compile(rf"{_DATE}\s+{_TIME}(?:{_SECONDS}(?:{_FRACTION})?)?")
+TIMESTAMPTZ_RE = re.compile(rf"{_DATE}\s+{_TIME}(?:{_SECONDS}(?:{_FRACTION})?)?{_TZ}")
+TZ_SUFFIX_RE = re.compile(
+    rf"(?:{_FRACTION})?{_TZ}"
+)  # what follows HH:MM:SS in a timestamptz
+TIME_RE = re.compile(rf"{_TIME}{_SECONDS}")
+TIMETZ_RE = re.compile(rf"{_TIME}{_SECONDS}{_TZ}")
+INTEGER_RE = re.compile(r"\s*(?P<sign>[+-]?)0*(?P<digits>\d+?)(?:\.0*)?\s*")
+DOUBLE_PRECISION_RE = re.compile(
+    r"\s*[+-]?(?:(?:\d+(?:\.\d*)?|\.\d+)(?:e[+-]?\d+)?|inf(?:inity)?|nan)\s*", re.I
+)
+
+DAYS_IN_MONTH = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+MONTH_DAYS = frozenset(
+    f"{month:02}-{day:02}"
+    for month in range(1, 13)
+    for day in range(1, (29 if month == 2 else DAYS_IN_MONTH[month]) + 1)
+)  # every MM-DD that exists in some year. 02-29 is checked against the year separately
+HOURS = frozenset(f"{hour:02}" for hour in range(24))
+MINUTE_SECONDS = frozenset(
+    f"{minute:02}:{second:02}" for minute in range(60) for second in range(60)
+)
+BOOLEAN_VALUES = frozenset(["0", "1", "true", "false"])
+SMALLINT_RANGE = (-32768, 32767)
+INTEGER_RANGE = (-2147483648, 2147483647)
+BIGINT_RANGE = (-9223372036854775808, 9223372036854775807)
+MAX_INTEGER_DIGITS = 19  # no value in BIGINT_RANGE has more digits than this
+
+
+def _valid_date(year: int, month: int, day: int) -> bool:
+    """Checks the date exists, without building a datetime"""
+    if year < 1 or not 1 <= month <= 12 or day < 1:
+        return False
+    if month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
+        return day <= 29
+    return day <= DAYS_IN_MONTH[month]
+
+
+def _valid_match(match: Optional[re.Match]) -> bool:
+    """Range checks the named groups of a date/time match"""
+    if match is None:
+        return False
+    groups = match.groupdict()
+    if groups.get("Y") is not None and not _valid_date(
+        int(groups["Y"]), int(groups["m"]), int(groups["d"])
+    ):
+        return False
+    if groups.get("S") is not None and int(groups["S"]) > 59:
+        return False
+    if groups.get("zH") is not None and int(groups["zH"]) > 23:
+        return False
+    return True
+
+
+def _canonical_date(x: str) -> bool:
+    """Checks a date in the usual YYYY-MM-DD layout with lookups instead of the regex, like date.fromisoformat does"""
+    if x[4] != "-" or x[5:] not in MONTH_DAYS or not x[:4].isdecimal():
+        return False
+    if x[5:] == "02-29":
+        year = int(x[:4])
+        return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+    return x[:4] != "0000"
+
+
+def _canonical_time(x: str) -> bool:
+    """Checks a time in the usual HH:MM:SS layout with lookups instead of the regex"""
+    return x[:2] in HOURS and x[2] == ":" and x[3:] in MINUTE_SECONDS
+
+
+def _integer_in_range(x: str, bounds: tuple) -> bool:
+    """Tests if the string is a whole number (optionally followed by .0) within the bounds"""
+    if (
+        x.isdecimal() and len(x) <= MAX_INTEGER_DIGITS
+    ):  # plain digits are by far the most common case, so the regex is only for the rest
+        return int(x) <= bounds[1]
+    match = INTEGER_RE.fullmatch(x)
+    if match is None:
+        return False
+    digits = match.group("digits")
+    if len(digits) > MAX_INTEGER_DIGITS:
+        return False
+    y = int(digits)
+    if match.group("sign") == "-":
+        y = -y
+    return bounds[0] <= y <= bounds[1]
+
+
+def date_func(x: str, _: Dict) -> bool:
+    """Tests if the string is a valid date"""
+    # Timestamp must be between 4713-01-01 BC and 5874897-12-31. Not implemented because it seems unnecessary
+    if x == "":
+        return True
+    if len(x) == 10 and x[7] == "-" and x[8] != " ":
+        return _canonical_date(x)
+    return _valid_match(DATE_RE.fullmatch(x))
+
+
+def timestamptz_func(x: str, _: Dict) -> bool:
+    """Tests if the string is a valid timestamptz"""
+    # Timestamp must be between 4713-01-01 00:00:00 BC and 5874897-12-31 12:59:59. Not implemented because it seems unnecessary
+    if x == "":
+        return True
+    if (
+        len(x) > 19
+        and x[10] == " "
+        and _canonical_date(x[:10])
+        and _canonical_time(x[11:19])
+        and _valid_match(TZ_SUFFIX_RE.fullmatch(x, 19))
+    ):
+        return True
+    return _valid_match(TIMESTAMPTZ_RE.fullmatch(x))
+
+
+def timestamp_func(x: str, _: Dict) -> bool:
+    """Tests if the string is a valid timestamp"""
+    # Timestamp must be between 4713-01-01 00:00:00 BC and 5874897-12-31 12:59:59. Not implemented because it seems unnecessary
+    if x == "":
+        return True
+    if (
+        len(x) == 19
+        and x[10] == " "
+        and _canonical_date(x[:10])
+        and _canonical_time(x[11:])
+    ):
+        return True
+    return _valid_match(TIMESTAMP_RE.fullmatch(x))
+
+
+def smallint_func(x: str, _: Dict) -> bool:
+    """Tests if the string is a valid smallint"""
+    if x == "":
+        return True
+    return _integer_in_range(x, SMALLINT_RANGE)
+
+
+def int_func(x: str, _: Dict) -> bool:
+    """Tests if the string is a valid int"""
+    if x == "":
+        return True
+    return _integer_in_range(x, INTEGER_RANGE)
+
+
+def bigint_func(x: str, _: Dict) -> bool:
+    """Tests if the string is a valid bigint"""
+    if x == "":
+        return True
+    return _integer_in_range(x, BIGINT_RANGE)
+
+
+def double_precision_func(x: str, _: Dict) -> bool:
+    """Tests if the string is a valid double precision"""
+    if x == "":
+        return True
+    if x.replace(".", "", 1).isdecimal():  # plain decimals skip the regex
+        return True
+    return DOUBLE_PRECISION_RE.fullmatch(x) is not None
+
+
+def boolean_func(x: str, _: Dict) -> bool:
+    """Tests if the string is a valid boolean"""
+    if x == "":
+        return True
+    return str(x).lower() in BOOLEAN_VALUES
+
+
+def varchar_func(x: str, type_info: Dict) -> bool:
+    """Tests if the string is a string less than 65536 bytes"""
+    row_len = len(str(x).encode("utf-8"))
+    type_info["suffix"] = max(row_len, type_info["suffix"] or 1)
+    return row_len < 65536
+
+
+def timetz_func(x: str, _: Dict) -> bool:
+    """Tests if the string is a valid timetz"""
+    if x == "":
+        return True
+    return _valid_match(TIMETZ_RE.fullmatch(x))
+
+
+def time_func(x: str, _: Dict) -> bool:
+    """Tests if the string is a valid time"""
+    if x == "":
+        return True
+    if len(x) == 8 and _canonical_time(x):
+        return True
+    return _valid_match(TIME_RE.fullmatch(x))
+
+
+def not_implemented(x: str, _: Dict) -> bool:
+    """Default function"""
+    return False
+
+
+# The vectorized kernels below take the codepoints of a column of values (see codepoints) and their lengths.
+# They return a mask of the values that definitely pass the type's func. They only look at the common, fixed layouts,
+# so a False just means the value still needs to go through the func
+KERNEL_WIDTH = 32  # no layout the kernels recognize is longer than this
+
+
+def codepoints(values: numpy.ndarray) -> numpy.ndarray:
+    """
+    The first KERNEL_WIDTH codepoints of each value as a (len(values), KERNEL_WIDTH) matrix, padded with zeros.
+    Built once per column and shared by all of the kernels
+    """
+    return (
+        values.astype(f"U{KERNEL_WIDTH}")
+        .view(numpy.uint32)
+        .reshape(len(values), KERNEL_WIDTH)
+    )
+
+
+def _is_digit(codes: numpy.ndarray) -> numpy.ndarray:
+    return (codes >= 48) & (
+        codes <= 57
+    )  # only ASCII digits, since those are what int() is fast for
+
+
+def _digits_to_int(codes: numpy.ndarray) -> numpy.ndarray:
+    """Reads each row of a matrix of digit codepoints as a base 10 number"""
+    ret = numpy.zeros(len(codes), dtype=numpy.int64)
+    for i in range(codes.shape[1]):
+        ret = ret * 10 + (codes[:, i].astype(numpy.int64) - 48)
+    return ret
+
+
+def _canonical_dates(codes: numpy.ndarray) -> numpy.ndarray:
+    """The vectorized _canonical_date, on the first 10 codepoints of each row"""
+    digits = codes[:, [0, 1, 2, 3, 5, 6, 8, 9]]
+    year = _digits_to_int(digits[:, :4])
+    month = _digits_to_int(digits[:, 4:6])
+    day = _digits_to_int(digits[:, 6:])
+    month_ok = (month >= 1) & (month <= 12)
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    max_day = numpy.array(DAYS_IN_MONTH)[numpy.where(month_ok, month, 0)] + (
+        leap & (month == 2)
+    )
+    return (
+        (codes[:, 4] == 45)  # -
+        & (codes[:, 7] == 45)
+        & _is_digit(digits).all(axis=1)
+        & month_ok
+        & (year >= 1)
+        & (day >= 1)
+        & (day <= max_day)
+    )
+
+
+def _canonical_times(codes: numpy.ndarray, start: int) -> numpy.ndarray:
+    """The vectorized _canonical_time, on the 8 codepoints of each row from start onwards"""
+    codes = codes[:, start : start + 8]  # noqa
+    digits = codes[:, [0, 1, 3, 4, 6, 7]]
+    return (
+        (codes[:, 2] == 58)  # :
+        & (codes[:, 5] == 58)
+        & _is_digit(digits).all(axis=1)
+        & (_digits_to_int(digits[:, :2]) < 24)
+        & (_digits_to_int(digits[:, 2:4]) < 60)
+        & (_digits_to_int(digits[:, 4:]) < 60)
+    )
+
+
+def date_kernel(codes: numpy.ndarray, lengths: numpy.ndarray) -> numpy.ndarray:
+    return (lengths == 10) & _canonical_dates(codes)
+
+
+def timestamp_kernel(codes: numpy.ndarray, lengths: numpy.ndarray) -> numpy.ndarray:
+    in_value = numpy.arange(20, 26)[None, :] < lengths[:, None]
+    fraction_ok = (lengths == 19) | (
+        (lengths >= 21)
+        & (lengths <= 26)
+        & (codes[:, 19] == 46)
+        & (_is_digit(codes[:, 20:26]) | ~in_value).all(axis=1)
+    )  # an optional .ffffff, the way pandas writes them
+    return (
+        fraction_ok
+        & _canonical_dates(codes)
+        & (codes[:, 10] == 32)  # space
+        & _canonical_times(codes, 11)
+    )
+
+
+def time_kernel(codes: numpy.ndarray, lengths: numpy.ndarray) -> numpy.ndarray:
+    return (lengths == 8) & _canonical_times(codes, 0)
+
+
+def _integer_kernel(bounds: tuple):
+    def kernel(codes: numpy.ndarray, lengths: numpy.ndarray) -> numpy.ndarray:
+        codes = codes[:, :18]  # 18 digits always fit in an int64
+        negative = codes[:, 0] == 45  # -
+        signed = negative | (codes[:, 0] == 43)  # +
+        is_digit = _is_digit(codes)
+        n_digits = is_digit.sum(axis=1)
+        ints = numpy.zeros(len(codes), dtype=numpy.int64)
+        for i in range(codes.shape[1]):
+            ints = numpy.where(
+                is_digit[:, i], ints * 10 + (codes[:, i].astype(numpy.int64) - 48), ints
+            )
+        ints = numpy.where(negative, -ints, ints)
+        return (
+            (lengths <= 18)
+            & (n_digits >= 1)
+            & (n_digits == lengths - signed)
+            & (ints >= bounds[0])
+            & (ints <= bounds[1])
+        )
+
+    return kernel
+
+
+def double_precision_kernel(
+    codes: numpy.ndarray, lengths: numpy.ndarray
+) -> numpy.ndarray:
+    signed = (codes[:, 0] == 45) | (codes[:, 0] == 43)
+    n_digits = _is_digit(codes).sum(axis=1)
+    n_dots = (codes == 46).sum(axis=1)
+    return (
+        (lengths <= KERNEL_WIDTH)
+        & (n_digits + n_dots == lengths - signed)
+        & (n_digits >= 1)
+        & (n_dots <= 1)
+    )
+
+
+def boolean_kernel(codes: numpy.ndarray, lengths: numpy.ndarray) -> numpy.ndarray:
+    lower = numpy.where(
+        (codes >= 65) & (codes <= 90), codes + 32, codes
+    )  # ASCII letters only, the rest can go through the func
+    ret = numpy.zeros(len(codes), dtype=bool)
+    for value in BOOLEAN_VALUES:
+        expected = numpy.array([ord(c) for c in value], dtype=numpy.uint32)
+        ret |= (lengths == len(value)) & (lower[:, : len(value)] == expected).all(
+            axis=1
+        )
+    return ret
+
+
+VECTORIZED_KERNELS = {
+    "DATE": date_kernel,
+    "TIMESTAMP": timestamp_kernel,
+    "SMALLINT": _integer_kernel(SMALLINT_RANGE),
+    "INTEGER": _integer_kernel(INTEGER_RANGE),
+    "BIGINT": _integer_kernel(BIGINT_RANGE),
+    "DOUBLE PRECISION": double_precision_kernel,
+    "BOOLEAN": boolean_kernel,
+    "TIME": time_kernel,
+}
@@ -46,10 +46,25 @@ def upload(
     "skip_checks": False,
     "stream_from_file": False,
     "skip_views": False,
-    "node_count": 1,
+    "node_count": None,
     "default_timeout": 30 * 60 * 1000,  # 30 minutes
     "lock_timeout": 5 * 1000,  # 5 seconds
     "allow_alter_table": False,
+    "columnar_inference": False,
+    "infer_in_parallel": None,
+    "infer_sample_rows": None,
+    "infer_sample_fraction": None,
+    "raw_passthrough": False,
+    "compression": "bzip2",
+    "compression_level": None,
+    "chunk_in_parallel": None,
+    "upload_queue_size": None,
+    "presort": False,
+    "memory_budget": None,
+    "multipart_threshold": 16 * 1024 ** 2,
+    "multipart_chunksize": 8 * 1024 ** 2,
+    "multipart_concurrency": 4,
+    "s3_backend": "threads",
     """
     start_time = time.time()
     source_args = source_args or []
@@ -85,6 +100,13 @@ def upload(
         raise ValueError(
             "The stream_from_file parameter only works when you supply a path to a CSV"
         )
+    if upload_options["raw_passthrough"] and not (
+        isinstance(source, str)
+        and source.endswith((".csv", *constants.COMPRESSED_SOURCES.keys()))
+    ):
+        raise ValueError(
+            "The raw_passthrough parameter only works when you supply a path to a CSV, gzipped CSV, or bzipped CSV"
+        )
     if upload_options["default_logging"]:
         local_utilities.initialize_logger(log_level)
 
@@ -103,7 +125,11 @@ def upload(
             "The table does not yet exist, you need the checks to determine what column types to use"
         )
     source = local_utilities.load_source(source, upload_options)
-    if source.num_rows == 0:
+    if upload_options["node_count"] is None and local_utilities.sizes_chunks(
+        source, upload_options
+    ):
+        upload_options["node_count"] = interface.get_slice_count()
+    if source.is_empty():
         raise ValueError(
             "The source must have at least a single row to run this program"
         )
@@ -113,10 +139,14 @@ def upload(
             column_types, interface, upload_options
         )
         local_utilities.fix_column_types(
-            source, interface, upload_options["drop_table"]
+            source, interface, upload_options["drop_table"], upload_options
         )
 
-        if not upload_options["drop_table"] and interface.table_exists:
+        if (
+            not upload_options["drop_table"]
+            and interface.table_exists
+            and source.unvalidated is None
+        ):
             redshift_utilities.compare_with_remote(source, upload_options, interface)
     else:
         log.info("Skipping data checks")
@@ -124,8 +154,26 @@ def upload(
     if not upload_options["skip_views"] and interface.table_exists:
         redshift_utilities.log_dependent_views(interface)
 
-    sources, load_in_parallel = local_utilities.chunkify(source, upload_options)
-    interface.load_to_s3(sources)
+    sampled = source.unvalidated is not None
+    sources, _ = local_utilities.chunkify(source, upload_options)
+    try:
+        if upload_options["s3_backend"] == "asyncio":
+            redshift_utilities.run_async_upload(interface, sources, upload_options)
+        else:
+            interface.load_to_s3(
+                sources,
+                upload_options["upload_queue_size"],
+                upload_options["memory_budget"],
+                redshift_utilities.transfer_config(upload_options),
+            )
+    finally:
+        source.close()  # every chunk has been built, so a mapped file isn't needed anymore
+    if sampled:  # the types can only be trusted once chunkify has checked every row
+        local_utilities.finish_column_types(
+            source, interface, upload_options["drop_table"]
+        )
+        if not upload_options["drop_table"] and interface.table_exists:
+            redshift_utilities.compare_with_remote(source, upload_options, interface)
 
     redshift_utilities.s3_to_redshift(
         interface, source.column_types, upload_options, source
@@ -136,8 +184,10 @@ def upload(
         redshift_utilities.reinstantiate_views(
             interface, upload_options["drop_table"], upload_options["grant_access"]
         )
-    if upload_options["cleanup_s3"] and source.num_rows > 0:
-        interface.cleanup_s3(load_in_parallel)
+    if upload_options[
+        "cleanup_s3"
+    ]:  # the source can't be empty (see is_empty), so there's always something to clean up. Checking num_rows could count the whole source here
+        interface.cleanup_s3(background=upload_options["cleanup_s3"] == "background")
 
     load_duration = round(time.time() - start_time, 2)
     log.info(
@@ -33,6 +33,10 @@ setuptools.setup(
         "pytest",
         "toposort",
     ],
+    extras_require={
+        "zstd": ["zstandard"],
+        "asyncio": ["aiobotocore"],
+    },
     long_description=(Path(__file__).parent / "README.md").read_text(),
     long_description_content_type="text/markdown",
 )
@@ -0,0 +1,84 @@
+from redshift_upload import column_type_utilities  # noqa
+import pytest  # noqa
+
+
+def brute_force(values):
+    """The original approach: tests every value against every viable type"""
+    viable = column_type_utilities.get_possible_data_types()
+    for x in values:
+        viable = [t for t in viable if t["func"](x, t)]
+    return viable
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        ["1", "2", "3"],
+        ["1", "0", "true"],
+        ["1", "", "70000"],
+        ["1", "2.5", "3"],
+        ["2020-01-01", "", "2020-01-02"],
+        ["2020-01-01", "2020-01-01 00:00:00"],
+        ["2020-01-01 00:00:00", "2020-01-01 00:00"],
+        ["12:00:00", "13:00:00+0100"],
+        ["True", "false", "1"],
+        ["a", "1", "2020-01-01"],
+        ["", ""],
+        ["1" * 70000],
+        ["99999999999", "1"],
+    ],
+)
+def test_column_inference(values):
+    inference = column_type_utilities.ColumnInference(
+        column_type_utilities.get_possible_data_types()
+    )
+    for x in values:
+        inference.update(x)
+    expected = brute_force(values)
+    actual = inference.viable_types()
+    assert [t["type"] for t in actual] == [t["type"] for t in expected]
+    assert [t["suffix"] for t in actual] == [t["suffix"] for t in expected]
+
+
+@pytest.mark.parametrize(
+    "first,second",
+    [
+        (["1", "2"], ["70000"]),
+        (["1", "2"], ["true"]),
+        (["2020-01-01"], ["2020-01-01 00:00:00"]),
+        (["abc"], ["1" * 10]),
+        (["1" * 70000], ["1"]),
+        ([], ["1"]),
+    ],
+)
+def test_column_inference_merge(first, second):
+    inferences = []
+    for values in (first, second):
+        inference = column_type_utilities.ColumnInference(
+            column_type_utilities.get_possible_data_types()
+        )
+        for x in values:
+            inference.update(x)
+        inferences.append(inference)
+    inferences[0].merge(inferences[1])
+    expected = brute_force(first + second)
+    actual = inferences[0].viable_types()
+    assert [t["type"] for t in actual] == [t["type"] for t in expected]
+    assert [t["suffix"] for t in actual] == [t["suffix"] for t in expected]
+
+
+def test_column_inference_predefined():
+    inference = column_type_utilities.ColumnInference(
+        [
+            x
+            for x in column_type_utilities.get_possible_data_types()
+            if x["type"] == "SMALLINT"
+        ]
+    )
+    assert inference.update("1")
+    assert not inference.update("a")
+    assert inference.viable_types() == []
+
+
+if __name__ == "__main__":
+    test_column_inference(["1", "0", "true"])
@@ -0,0 +1,75 @@
+from redshift_upload import column_type_utilities, constants, local_utilities  # noqa
+from redshift_upload.db_interfaces import dummy  # noqa
+import numpy
+import pytest  # noqa
+
+columns = [
+    ["1", "2", "3"],
+    ["1", "0", "true"],
+    ["1", "", "70000"],
+    ["-32768", "32767"],
+    ["-32769", "+5"],
+    ["9223372036854775807", "1"],
+    ["9223372036854775808"],
+    ["007", " 7 ", "7.0"],
+    ["1", "2.5", "3", "nan", "-1e10", "inf"],
+    ["2020-01-01", "", "2020-01-02"],
+    ["2020-02-30"],
+    ["2020-01-01", "2020-01-01 00:00:00"],
+    ["2020-01-01 00:00:00", "2020-01-01 00:00:00.123456"],
+    ["2020-01-01 00:00:00", "2020-01-01 00:00"],
+    ["2020-01-01 24:00:00"],
+    ["2020-01-01T00:00:00+01:00"],
+    ["12:00:00", "13:00:00+0100"],
+    ["23:59:59", "00:00:00.5"],
+    ["True", "false", "1", "FALSE"],
+    ["a", "1", "2020-01-01"],
+    ["é", "ü" * 10],
+    ["", ""],
+    [],
+    ["1" * 70000],
+]
+
+
+@pytest.mark.parametrize("values", columns)
+def test_from_column(values):
+    """The columnar inference must agree with feeding the values in one at a time"""
+    candidates = column_type_utilities.get_possible_data_types()
+    expected = column_type_utilities.ColumnInference(candidates)
+    for x in values:
+        expected.update(x)
+    actual = column_type_utilities.ColumnInference.from_column(
+        numpy.array(values, dtype=object), candidates
+    )
+    assert [t["type"] for t in actual.viable_types()] == [
+        t["type"] for t in expected.viable_types()
+    ]
+    assert [t["suffix"] for t in actual.viable_types()] == [
+        t["suffix"] for t in expected.viable_types()
+    ]
+
+
+def test_columnar_fix_column_types():
+    rows = [
+        {"a": str(i), "b": f"2020-01-{i % 28 + 1:02}", "c": "x" * (i % 7), "d": ""}
+        for i in range(1000)
+    ]
+    by_row = local_utilities.load_source(rows)
+    local_utilities.fix_column_types(by_row, dummy.Interface(), False)
+    by_column = local_utilities.load_source(rows)
+    local_utilities.fix_column_types(
+        by_column,
+        dummy.Interface(),
+        False,
+        {**constants.UPLOAD_DEFAULTS, "columnar_inference": True},
+    )
+    assert by_column.num_rows == by_row.num_rows == 1000
+    for col in "abcd":
+        assert by_column.column_types[col]["type"] == by_row.column_types[col]["type"]
+        assert (
+            by_column.column_types[col]["suffix"] == by_row.column_types[col]["suffix"]
+        )
+
+
+if __name__ == "__main__":
+    test_from_column(["1", "2.5", "3"])
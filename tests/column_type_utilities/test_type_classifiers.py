@@ -0,0 +1,124 @@
+from redshift_upload import type_classifiers  # noqa
+import datetime
+import pytest  # noqa
+
+
+def strptime_func(formats):
+    """The approach the classifiers replaced"""
+
+    def func(x):
+        for fmt in formats:
+            try:
+                datetime.datetime.strptime(x, fmt)
+                return True
+            except ValueError:
+                pass
+        return False
+
+    return func
+
+
+temporal_values = [
+    "2020-01-01",
+    "2020-1-1",
+    "2020-01- 1",
+    "2020-02-29",
+    "2019-02-29",
+    "1900-02-29",
+    "2000-02-29",
+    "2020-02-30",
+    "2020-13-01",
+    "0000-01-01",
+    "20200101",
+    "2020-01-01 00:00:00",
+    "2020-01-01  00:00:00",
+    "2020-01-01 1:2:3",
+    "2020-01-01 23:59",
+    "2020-01-01 24:00:00",
+    "2020-01-01 00:00:59123",
+    "2020-01-01 00:00:00+0000",
+    "2020-01-01 00:00:00-05:30",
+    "2020-01-01 00:00:00Z",
+    "2020-01-01 00:00:00z",
+    "2020-01-01 00:00:00+2400",
+    "2020-01-01 00:00+01:00",
+    "12:00:00",
+    "12:00:60",
+    "1:2:3",
+    "12:00:00+0100",
+    "12:00:00 +0100",
+    "hello",
+    "1",
+]
+
+
+@pytest.mark.parametrize(
+    "func,formats",
+    [
+        (type_classifiers.date_func, ["%Y-%m-%d"]),
+        (
+            type_classifiers.timestamp_func,
+            ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M:%S%f", "%Y-%m-%d %H:%M"],
+        ),
+        (
+            type_classifiers.timestamptz_func,
+            ["%Y-%m-%d %H:%M:%S%z", "%Y-%m-%d %H:%M:%S%f%z", "%Y-%m-%d %H:%M%z"],
+        ),
+        (type_classifiers.time_func, ["%H:%M:%S"]),
+        (type_classifiers.timetz_func, ["%H:%M:%S%z"]),
+    ],
+)
+def test_matches_strptime(func, formats):
+    expected = strptime_func(formats)
+    for x in temporal_values:
+        assert func(x, None) == expected(x), x
+
+
+@pytest.mark.parametrize(
+    "func,x",
+    [
+        (type_classifiers.timestamp_func, "2020-01-01 00:00:00.123456"),
+        (type_classifiers.timestamptz_func, "2020-01-01 00:00:00.5+00:00"),
+    ],
+)
+def test_dotted_fractional_seconds(func, x):
+    assert func(x, None)
+
+
+def test_no_leap_seconds():
+    # strptime accepts this by reading it as second 6 and fraction 1
+    assert not type_classifiers.timestamp_func("2020-01-01 00:00:61", None)
+
+
+@pytest.mark.parametrize(
+    "x,smallint,integer,bigint,double",
+    [
+        ("0", True, True, True, True),
+        ("-0", True, True, True, True),
+        ("100000", False, True, True, True),
+        ("32767", True, True, True, True),
+        ("-32768", True, True, True, True),
+        ("32768", False, True, True, True),
+        ("1.0", True, True, True, True),
+        ("1.", True, True, True, True),
+        ("1.5", False, False, False, True),
+        ("0000000000000000000000001", True, True, True, True),
+        ("9223372036854775807", False, False, True, True),
+        ("9223372036854775808", False, False, False, True),
+        ("-9223372036854775808", False, False, True, True),
+        ("1e5", False, False, False, True),
+        ("nan", False, False, False, True),
+        ("1_000", False, False, False, False),
+        ("abc", False, False, False, False),
+        ("1" * 5000, False, False, False, True),
+    ],
+)
+def test_numbers(x, smallint, integer, bigint, double):
+    assert type_classifiers.smallint_func(x, None) == smallint
+    assert type_classifiers.int_func(x, None) == integer
+    assert type_classifiers.bigint_func(x, None) == bigint
+    assert type_classifiers.double_precision_func(x, None) == double
+
+
+if __name__ == "__main__":
+    test_numbers("0", True, True, True, True)
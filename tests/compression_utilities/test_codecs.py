@@ -0,0 +1,71 @@
+from redshift_upload import compression_utilities  # noqa
+import bz2
+import gzip
+import subprocess
+import pytest  # noqa
+
+data = "".join(f"{i},text {i},{i / 7}\r\n" for i in range(10000)).encode("utf-8")
+
+
+def decompress_zstd(compressed):
+    import zstandard  # type: ignore
+
+    return zstandard.ZstdDecompressor().decompressobj().decompress(compressed)
+
+
+def decompress_lzop(compressed):
+    return subprocess.run(
+        ["lzop", "-d", "--stdout"], input=compressed, stdout=subprocess.PIPE
+    ).stdout
+
+
+@pytest.mark.parametrize(
+    "name,level,decompress",
+    [
+        ("bzip2", None, bz2.decompress),
+        ("bzip2", 1, bz2.decompress),
+        ("gzip", None, gzip.decompress),
+        ("gzip", 1, gzip.decompress),
+        ("zstd", None, decompress_zstd),
+        ("zstd", 1, decompress_zstd),
+        ("lzop", None, decompress_lzop),
+        ("none", None, lambda x: x),
+    ],
+)
+def test_codecs(name, level, decompress):
+    missing = compression_utilities.CODECS[name].missing()
+    if missing:
+        pytest.skip(missing)
+    compressor = compression_utilities.compressor(name, level)
+    compressed = b"".join(
+        compressor.compress(data[i : i + 1000])
+        for i in range(0, len(data), 1000)  # noqa
+    )
+    compressed += compressor.flush()
+    assert decompress(compressed) == data
+    assert compression_utilities.compress(data, name, level) == compressed
+
+
+@pytest.mark.parametrize(
+    "name,level,is_good",
+    [
+        ("bzip2", None, True),
+        ("bzip2", 9, True),
+        ("bzip2", 0, False),
+        ("gzip", 0, True),
+        ("gzip", 4.0, False),
+        ("none", None, True),
+        ("none", 1, False),
+        ("brotli", None, False),
+    ],
+)
+def test_check_codec(name, level, is_good):
+    if is_good:
+        compression_utilities.check_codec(name, level)
+    else:
+        with pytest.raises(ValueError):
+            compression_utilities.check_codec(name, level)
+
+
+if __name__ == "__main__":
+    test_codecs("gzip", 1, gzip.decompress)
@@ -39,6 +39,22 @@ bad_upload_options = {
     "truncate_table": True,
     "drop_table": True,
 }
+streamed_columnar_upload_options = {
+    "stream_from_file": True,
+    "columnar_inference": True,
+}
+unchecked_passthrough_upload_options = {
+    "raw_passthrough": True,
+}
+unsorted_presort_upload_options = {
+    "presort": True,
+}
+background_cleanup_upload_options = {
+    "cleanup_s3": "background",
+}
+unknown_cleanup_upload_options = {
+    "cleanup_s3": "later",
+}
 
 
 @pytest.mark.parametrize(
@@ -50,6 +66,11 @@ bad_upload_options = {
         ("a", "b", bad_upload_options, bad_credentials, False),
         ("a", "", good_upload_options, good_credentials, False),
         ("a", None, good_upload_options, good_credentials, False),
+        ("a", "b", streamed_columnar_upload_options, good_credentials, False),
+        ("a", "b", unchecked_passthrough_upload_options, good_credentials, False),
+        ("a", "b", unsorted_presort_upload_options, good_credentials, False),
+        ("a", "b", background_cleanup_upload_options, good_credentials, True),
+        ("a", "b", unknown_cleanup_upload_options, good_credentials, False),
     ],
 )
 def test_check_coherence(schema_name, table_name, upload_options, aws_info, is_good):
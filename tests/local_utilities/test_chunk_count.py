@@ -0,0 +1,66 @@
+from redshift_upload import local_utilities, constants  # noqa
+import pytest  # noqa
+
+MB = 1024 ** 2
+
+
+@pytest.mark.parametrize(
+    "compressed_size,slice_count,expected",
+    [
+        (0, 1, 1),
+        (0.5 * MB, 4, 1),
+        (2.5 * MB, 4, 2),
+        (10 * MB, 4, 4),
+        (10 * MB, 1, 1),
+        (100 * MB, 1, 2),
+        (100 * MB, 4, 4),
+        (1000 * MB, 4, 16),
+        (1000 * MB, 6, 18),
+    ],
+)
+def test_chunk_count_for(compressed_size, slice_count, expected):
+    count = local_utilities.chunk_count_for(compressed_size, slice_count)
+    assert count == expected
+    if compressed_size >= slice_count * constants.MIN_CHUNK_SIZE:
+        assert count % slice_count == 0
+        assert constants.MIN_CHUNK_SIZE <= compressed_size / count
+    assert compressed_size / count <= constants.TARGET_CHUNK_SIZE
+
+
+@pytest.mark.parametrize("compression", ["bzip2", "gzip", "none"])
+def test_compression_ratio(compression):
+    text = "a,b\n" + "".join(f"{i},{'x' * (i % 50)}\n" for i in range(100000))
+    source = local_utilities.load_source(text)
+    ratio = local_utilities.compression_ratio(
+        source, {**constants.UPLOAD_DEFAULTS, "compression": compression}
+    )
+    if compression == "none":
+        assert ratio == 1
+    else:
+        assert 0 < ratio < 0.5
+
+
+def test_split_by_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(constants, "ROW_INDEX_STRIDE", 2)
+    rows = [f"{i},{'x' * (1000 if i < 100 else 1)}\n" for i in range(1000)]
+    path = tmp_path / "source.csv"
+    path.write_text("a,b\n" + "".join(rows))
+    for source in [
+        local_utilities.load_source("a,b\n" + "".join(rows)),
+        local_utilities.load_source(
+            str(path), {**constants.UPLOAD_DEFAULTS, "stream_from_file": True}
+        ),
+    ]:
+        ranges = source.split(4)
+        sizes = [end - start for start, end in ranges]
+        assert len(ranges) == 4
+        assert max(sizes) < 2 * min(
+            sizes
+        )  # splitting by row count would put most of the bytes in the first range
+        assert [row for start, end in ranges for row in source.rows_in(start, end)] == [
+            row.strip().split(",") for row in rows
+        ]
+
+
+if __name__ == "__main__":
+    test_chunk_count_for(1000 * MB, 4, 16)
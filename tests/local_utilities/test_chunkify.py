@@ -0,0 +1,60 @@
+from redshift_upload import local_utilities, constants  # noqa
+from redshift_upload.db_interfaces import dummy  # noqa
+import bz2
+import csv
+import io
+import types
+import pytest  # noqa
+
+rows_in = [{"a": str(i), "b": f"text {i}"} for i in range(10)]
+rows_out = [[str(i), f"text {i}"] for i in range(10)]
+
+
+def decompress(chunks):
+    ret = []
+    for _, chunk in chunks:
+        ret.extend(csv.reader(io.StringIO(bz2.decompress(chunk).decode("utf-8"))))
+    return ret
+
+
+@pytest.mark.parametrize(
+    "load_in_parallel,chunk_in_parallel",
+    [
+        (1, None),
+        (3, None),
+        (10, None),
+        (3, 2),
+        (10, 4),
+    ],
+)
+def test_chunkify(load_in_parallel, chunk_in_parallel):
+    source = local_utilities.load_source(rows_in)
+    local_utilities.fix_column_types(source, dummy.Interface(), False)
+    upload_options = {
+        **constants.UPLOAD_DEFAULTS,
+        "load_in_parallel": load_in_parallel,
+        "chunk_in_parallel": chunk_in_parallel,
+    }
+    chunks, chunk_count = local_utilities.chunkify(source, upload_options)
+    assert isinstance(chunks, types.GeneratorType)  # chunks are built lazily
+    chunks = list(chunks)
+    if chunk_in_parallel is None:
+        assert [i for i, _ in chunks] == list(range(chunk_count))
+    else:  # the text is split by size, so there may be fewer chunks
+        assert [i for i, _ in chunks] == list(range(len(chunks)))
+        assert len(chunks) <= chunk_count
+    assert decompress(chunks) == rows_out
+
+
+@pytest.mark.parametrize("block_rows", [1, 3, 100])
+def test_write_chunk(monkeypatch, block_rows):
+    monkeypatch.setattr(constants, "WRITE_BLOCK_ROWS", block_rows)
+    chunk = local_utilities.write_chunk(iter(rows_out), None, "bzip2", None)
+    assert decompress([(0, chunk)]) == rows_out
+    assert local_utilities.write_chunk(iter([]), None, "bzip2", None) == bz2.compress(
+        b""
+    )
+
+
+if __name__ == "__main__":
+    test_chunkify(3, 2)
@@ -0,0 +1,66 @@
+from redshift_upload import local_utilities  # noqa
+from redshift_upload.db_interfaces import dummy  # noqa
+import numpy
+import pandas
+import pytest  # noqa
+
+frames = [
+    pandas.DataFrame({"a": [1, 2, 3]}),
+    pandas.DataFrame({"a": [1, -70000, 3]}),
+    pandas.DataFrame({"a": [2 ** 40, 0]}),
+    pandas.DataFrame({"a": numpy.array([2 ** 63 + 1, 0], dtype=numpy.uint64)}),
+    pandas.DataFrame({"a": pandas.array([1, None, 3], dtype="Int64")}),
+    pandas.DataFrame({"a": [1.0, None, 3.0]}),
+    pandas.DataFrame({"a": [1.5, None, 3.0]}),
+    pandas.DataFrame({"a": [1e20, 1.0]}),
+    pandas.DataFrame({"a": [float("inf"), 1.0]}),
+    pandas.DataFrame({"a": [None, None]}, dtype=float),
+    pandas.DataFrame({"a": [True, False]}),
+    pandas.DataFrame({"a": pandas.array([True, None], dtype="boolean")}),
+    pandas.DataFrame({"a": pandas.to_datetime(["2020-01-01", None])}),
+    pandas.DataFrame(
+        {"a": pandas.to_datetime(["2020-01-01 00:00", "2020-01-01 01:00"])}
+    ),
+    pandas.DataFrame({"a": pandas.to_datetime(["2020-01-01 00:00:00.5"])}),
+    pandas.DataFrame({"a": pandas.to_datetime(["2020-01-01"]).tz_localize("UTC")}),
+    pandas.DataFrame({"a": ["1", None, "2"]}),
+    pandas.DataFrame({"a": ["x", "2020-01-01"]}),
+    pandas.DataFrame({"a": [1, "x"]}, dtype=object),
+    pandas.DataFrame({"a": [1, 2], "b": ["c", "d"], "c": [0.5, 1.0]}),
+]
+
+
+def csv_types(df):
+    """The types found by reading the CSV back, as though the DataFrame were a plain CSV"""
+    source = local_utilities.load_source(df)
+    source.frame = None
+    local_utilities.fix_column_types(source, dummy.Interface(), False)
+    return source
+
+
+@pytest.mark.parametrize("df", frames)
+def test_frame_inference(df):
+    expected = csv_types(df)
+    actual = local_utilities.load_source(df)
+    assert actual.frame is df
+    local_utilities.fix_column_types(actual, dummy.Interface(), False)
+    assert actual.num_rows == expected.num_rows
+    assert [(x["type"], x["suffix"]) for x in actual.column_types.values()] == [
+        (x["type"], x["suffix"]) for x in expected.column_types.values()
+    ]
+
+
+def test_frame_inference_predefined():
+    source = local_utilities.load_source(pandas.DataFrame({"a": [1, 2]}))
+    source.predefined_columns = {"a": {"type": "BIGINT", "suffix": None}}
+    local_utilities.fix_column_types(source, dummy.Interface(), False)
+    assert source.column_types["a"]["type"] == "BIGINT"
+
+    source = local_utilities.load_source(pandas.DataFrame({"a": [1.5, 2]}))
+    source.predefined_columns = {"a": {"type": "BIGINT", "suffix": None}}
+    with pytest.raises(ValueError):
+        local_utilities.fix_column_types(source, dummy.Interface(), False)
+
+
+if __name__ == "__main__":
+    test_frame_inference(frames[0])
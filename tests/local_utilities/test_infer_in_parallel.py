@@ -0,0 +1,54 @@
+from redshift_upload import local_utilities, constants  # noqa
+from redshift_upload.db_interfaces import dummy  # noqa
+import csv
+import io
+import pytest  # noqa
+
+rows = [
+    {"a": str(i), "b": f'line one\nline "two" {i}', "c": ["true", "false"][i % 2]}
+    for i in range(200)
+] + [{"a": "1.5", "b": "", "c": "1"}]
+
+
+def to_csv(rows):
+    f = io.StringIO()
+    writer = csv.DictWriter(f, rows[0].keys())
+    writer.writeheader()
+    writer.writerows(rows)
+    return f.getvalue()
+
+
+@pytest.mark.parametrize("count", [1, 2, 7, 1000])
+def test_split_rows(count):
+    text = to_csv(rows)
+    header_end, _ = local_utilities.next_row_start(text, 0, (0, 0))
+    segments = local_utilities.split_rows(text, header_end, count)
+    assert 1 <= len(segments) <= count
+    assert segments[0][0] == header_end and segments[-1][1] == len(text)
+    parsed = []
+    for start, end in segments:
+        parsed.extend(csv.DictReader(io.StringIO(text[start:end]), rows[0].keys()))
+    assert parsed == rows
+
+
+def test_infer_in_parallel(monkeypatch):
+    monkeypatch.setattr(constants, "MIN_INFER_SEGMENT_SIZE", 1)
+    expected = local_utilities.load_source(rows)
+    local_utilities.fix_column_types(expected, dummy.Interface(), False)
+    actual = local_utilities.load_source(rows)
+    local_utilities.fix_column_types(
+        actual,
+        dummy.Interface(),
+        False,
+        {**constants.UPLOAD_DEFAULTS, "infer_in_parallel": 4},
+    )
+    assert actual.num_rows == expected.num_rows == len(rows)
+    for col in "abc":
+        assert actual.column_types[col]["type"] == expected.column_types[col]["type"]
+        assert (
+            actual.column_types[col]["suffix"] == expected.column_types[col]["suffix"]
+        )
+
+
+if __name__ == "__main__":
+    test_split_rows(7)
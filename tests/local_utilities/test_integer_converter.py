@@ -0,0 +1,61 @@
+from redshift_upload import local_utilities  # noqa
+import numpy
+import pandas
+import pytest  # noqa
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ("12", "12"),
+        ("-12", "-12"),
+        ("12.0", "12"),
+        ("-12.0", -12),
+        ("12.000", 12),
+        ("12.5", 12),
+        ("1.0e10", 10000000000),
+        ("9007199254740993", "9007199254740993"),  # 2**53 + 1, which a float rounds
+        ("9223372036854775807", 9223372036854775807),
+        ("9223372036854775807.0", 9223372036854775807),
+        ("-922337203685477580", "-922337203685477580"),
+        ("-9223372036854775808", -9223372036854775808),
+        ("", None),
+    ],
+)
+def test_bigint_converter(value, expected):
+    assert local_utilities.bigint_converter(value) == expected
+
+
+@pytest.mark.parametrize(
+    "converter,value",
+    [
+        (local_utilities.smallint_converter, "32768"),
+        (local_utilities.smallint_converter, "-32769"),
+        (local_utilities.integer_converter, "2147483648"),
+        (local_utilities.bigint_converter, "9223372036854775808"),
+        (local_utilities.bigint_converter, "1e19"),
+        (local_utilities.bigint_converter, "abc"),
+        (local_utilities.bigint_converter, "-"),
+        (local_utilities.bigint_converter, ".0"),
+    ],
+)
+def test_bad_integer(converter, value):
+    with pytest.raises(ValueError):
+        converter(value)
+
+
+def test_integral_floats():
+    frame = pandas.DataFrame(
+        {"a": [1.0, numpy.nan], "b": [1.5, 2.0], "c": [2.0 ** 53 + 2, 1.0]}
+    )
+    source = local_utilities.load_source(frame)
+    assert source.source.getvalue().splitlines() == [
+        "a,b,c",
+        "1,1.5,9007199254740994",
+        ",2.0,1",
+    ]
+    assert source.frame is frame  # the types are still inferred from the floats
+
+
+if __name__ == "__main__":
+    test_integral_floats()
@@ -0,0 +1,96 @@
+from redshift_upload import local_utilities, constants  # noqa
+from redshift_upload.db_interfaces import dummy  # noqa
+import bz2
+import csv
+import io
+import pathlib
+import tempfile
+import pytest  # noqa
+
+texts = [
+    "a,b\n1,x\n2,y\n3,z\n",
+    "a,b\r\n1,x\r\n2,y\r\n3,z",
+    'a,b\n1,"multi\nline"\n2,"quoted ""x"", y"\n\n3,\n4\n',
+    'a,b\n1,"ü\n""é"""\n\r\n2,日本\n5,6\n7,8\n9,10\n11,12\n',
+    "a,b\n",
+    "a,b",
+]
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    """Tiny blocks, so the block boundaries land inside rows"""
+    monkeypatch.setattr(constants, "ROW_INDEX_STRIDE", 2)
+    monkeypatch.setattr(constants, "READ_BLOCK_SIZE", 5)
+
+
+def load(tmp_path, text):
+    path = tmp_path / "source.csv"
+    path.write_bytes(text.encode("utf-8"))
+    return local_utilities.load_source(
+        str(path), {**constants.UPLOAD_DEFAULTS, "stream_from_file": True}
+    )
+
+
+@pytest.mark.parametrize("text", texts)
+def test_mapped_source(tmp_path, text):
+    source = load(tmp_path, text)
+    expected = local_utilities.Source(io.StringIO(text, newline=""))
+    assert isinstance(source, local_utilities.MappedSource)
+    assert source.fieldnames == expected.fieldnames
+    assert source.num_rows == expected.num_rows
+    assert list(source.rows()) == list(expected.rows())
+    assert list(source.dictrows()) == list(expected.dictrows())
+    for count in [1, 2, 3, 100]:
+        rows = []
+        for start, end in source.split(count):
+            rows.extend(source.rows_in(start, end))
+        assert rows == list(expected.rows())[1:]
+    for block in range(len(source.index)):
+        assert source.row_at(block) == next(
+            source.rows_in(int(source.index[block]), source.size)
+        )
+
+
+@pytest.mark.parametrize("chunk_in_parallel", [None, 3])
+def test_mapped_chunkify(tmp_path, chunk_in_parallel):
+    text = "a,b\n" + "".join(f'{i},"text\n{i}"\n' for i in range(100))
+    source = load(tmp_path, text)
+    local_utilities.fix_column_types(source, dummy.Interface(), False)
+    chunks, _ = local_utilities.chunkify(
+        source,
+        {
+            **constants.UPLOAD_DEFAULTS,
+            "load_in_parallel": 7,
+            "chunk_in_parallel": chunk_in_parallel,
+        },
+    )
+    rows = []
+    for _, chunk in chunks:
+        rows.extend(csv.reader(io.StringIO(bz2.decompress(chunk).decode("utf-8"))))
+    assert rows == [[str(i), f"text\n{i}"] for i in range(100)]
+
+
+def test_mapped_infer_in_parallel(tmp_path, monkeypatch):
+    monkeypatch.setattr(constants, "MIN_INFER_SEGMENT_SIZE", 1)
+    text = "a,b\n" + "".join(f'{i},"text\n{i}"\n' for i in range(100)) + "1.5,x\n"
+    source = load(tmp_path, text)
+    local_utilities.fix_column_types(
+        source,
+        dummy.Interface(),
+        False,
+        {**constants.UPLOAD_DEFAULTS, "infer_in_parallel": 3},
+    )
+    assert source.num_rows == 101
+    assert source.column_types["a"]["type"] == "DOUBLE PRECISION"
+    assert source.column_types["b"]["suffix"] == 7
+
+
+if __name__ == "__main__":
+    test_mapped_source(pathlib.Path(tempfile.mkdtemp()), texts[2])
+
+
+def test_mapped_close(tmp_path):
+    with load(tmp_path, texts[0]) as source:
+        assert source.num_rows == 3
+    assert source.mm.closed
@@ -0,0 +1,28 @@
+from redshift_upload import local_utilities  # noqa
+from redshift_upload.db_interfaces import dummy  # noqa
+import pytest  # noqa
+
+
+@pytest.mark.parametrize(
+    "source,num_rows",
+    [
+        ([{"a": 1}, {"a": 2}, {"a": 3}], 3),
+        ("a\n", 0),
+        ("a,b\n1,2\n\n3,4\n", 2),
+    ],
+)
+def test_num_rows(source, num_rows):
+    source = local_utilities.load_source(source)
+    assert source.is_empty() == (num_rows == 0)
+    local_utilities.fix_column_types(source, dummy.Interface(), False)
+    assert source._num_rows == num_rows  # counted during the type scan
+    assert source.num_rows == num_rows
+
+
+def test_num_rows_without_scan():
+    source = local_utilities.load_source("a,b\n1,2\n3,4\n")
+    assert source.num_rows == 2
+
+
+if __name__ == "__main__":
+    test_num_rows([{"a": 1}, {"a": 2}, {"a": 3}], 3)
@@ -0,0 +1,106 @@
+from redshift_upload import local_utilities, constants  # noqa
+from redshift_upload.db_interfaces import dummy  # noqa
+import bz2
+import csv
+import io
+import logging
+import random
+import pytest  # noqa
+
+
+@pytest.mark.parametrize(
+    "col_type,values,expected",
+    [
+        (
+            "BIGINT",
+            ["10", "", "-3", "2.0", "9007199254740993", "9007199254740992"],
+            ["-3", "2.0", "10", "9007199254740992", "9007199254740993", ""],
+        ),
+        (
+            "DOUBLE PRECISION",
+            ["1.5", "nan", "-1e3", "10"],
+            ["-1e3", "1.5", "10", "nan"],
+        ),
+        (
+            "DATE",
+            ["2020-10-01", "2020-9-30", "", "2019-12-31"],
+            ["2019-12-31", "2020-9-30", "2020-10-01", ""],
+        ),
+        (
+            "TIMESTAMP",
+            ["2020-01-01 10:00:00", "2020-01-01 9:00:00.5", "2020-01-01 9:00:00.25"],
+            ["2020-01-01 9:00:00.25", "2020-01-01 9:00:00.5", "2020-01-01 10:00:00"],
+        ),
+        (
+            "TIMESTAMPTZ",
+            ["2020-01-01 06:00:00+0000", "", "2020-01-01 10:00:00+0500"],
+            ["2020-01-01 10:00:00+0500", "2020-01-01 06:00:00+0000", ""],
+        ),
+        (
+            "TIMESTAMPTZ",
+            [
+                "2020-01-01 10:00:00.5Z",
+                "2020-01-01 9:30:00-01:00",
+                "2020-01-01 10:00:00.25+00:00",
+                "2019-12-31 23:00+0100",
+            ],
+            [
+                "2019-12-31 23:00+0100",
+                "2020-01-01 10:00:00.25+00:00",
+                "2020-01-01 10:00:00.5Z",
+                "2020-01-01 9:30:00-01:00",
+            ],
+        ),
+        (
+            "TIMETZ",
+            ["10:00:00+0500", "9:00:00-01:00", "06:00:00Z", "9:00:00+0430"],
+            ["9:00:00+0430", "10:00:00+0500", "06:00:00Z", "9:00:00-01:00"],
+        ),
+        ("VARCHAR", ["b", "B", "a", ""], ["B", "a", "b", ""]),
+    ],
+)
+def test_row_sort_key(col_type, values, expected):
+    key = local_utilities.row_sort_key(0, col_type)
+    assert [row[0] for row in sorted(([x] for x in values), key=key)] == expected
+
+
+@pytest.mark.parametrize("run_size", [1, 50, 10 ** 6])
+def test_presort_rows(monkeypatch, run_size):
+    monkeypatch.setattr(constants, "PRESORT_RUN_SIZE", run_size)
+    rows = [[str(random.randint(0, 20)), str(i)] for i in range(200)]
+    key = local_utilities.row_sort_key(0, "INTEGER")
+    assert list(local_utilities.presort_rows(rows, key)) == sorted(rows, key=key)
+
+
+def test_presort_run_size(monkeypatch, caplog):
+    """The rows are ~4 characters each, but take a few hundred bytes as Python objects, so these have to be split into runs"""
+    monkeypatch.setattr(constants, "PRESORT_RUN_SIZE", 10 ** 4)
+    rows = [[str(random.randint(0, 9)), str(i % 10)] for i in range(1000)]
+    key = local_utilities.row_sort_key(0, "INTEGER")
+    with caplog.at_level(logging.DEBUG, logger="redshift_utilities"):
+        assert list(local_utilities.presort_rows(rows, key)) == sorted(rows, key=key)
+    assert "sorted runs" in caplog.text
+
+
+def test_chunkify_presort(monkeypatch):
+    monkeypatch.setattr(constants, "PRESORT_RUN_SIZE", 100)
+    rows = [{"a": str(i % 7), "b": f"text {i}"} for i in range(50)]
+    source = local_utilities.load_source(rows)
+    local_utilities.fix_column_types(source, dummy.Interface(), False)
+    upload_options = {
+        **constants.UPLOAD_DEFAULTS,
+        "load_in_parallel": 3,
+        "sortkey": "a",
+        "presort": True,
+    }
+    chunks, _ = local_utilities.chunkify(source, upload_options)
+    written = []
+    for _, chunk in chunks:
+        written.extend(csv.reader(io.StringIO(bz2.decompress(chunk).decode("utf-8"))))
+    assert written == sorted(
+        ([x["a"], x["b"]] for x in rows), key=lambda row: int(row[0])
+    )
+
+
+if __name__ == "__main__":
+    test_chunkify_presort(pytest.MonkeyPatch())
@@ -0,0 +1,92 @@
+from redshift_upload import local_utilities, constants  # noqa
+import bz2
+import gzip
+import pytest  # noqa
+
+text = 'a,b\n1,"multi\nline"\n2,"quoted ""x"", y"\n3,z\n4,\n' * 5
+upload_options = {
+    **constants.UPLOAD_DEFAULTS,
+    "skip_checks": True,
+    "raw_passthrough": True,
+}
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    """Tiny blocks, so the file is split into several ranges"""
+    monkeypatch.setattr(constants, "ROW_INDEX_STRIDE", 2)
+    monkeypatch.setattr(constants, "READ_BLOCK_SIZE", 5)
+
+
+@pytest.mark.parametrize(
+    "load_in_parallel,chunk_in_parallel",
+    [
+        (1, None),
+        (3, None),
+        (100, None),
+        (3, 2),
+    ],
+)
+def test_raw_passthrough(tmp_path, load_in_parallel, chunk_in_parallel):
+    path = tmp_path / "source.csv"
+    path.write_bytes(text.encode("utf-8"))
+    source = local_utilities.load_source(str(path), upload_options)
+    chunks, chunk_count = local_utilities.chunkify(
+        source,
+        {
+            **upload_options,
+            "load_in_parallel": load_in_parallel,
+            "chunk_in_parallel": chunk_in_parallel,
+        },
+    )
+    chunks = list(chunks)
+    assert len(chunks) <= chunk_count
+    assert [i for i, _ in chunks] == list(range(len(chunks)))
+    data = b"".join(bz2.decompress(chunk) for _, chunk in chunks)
+    assert data == text.encode("utf-8")[len("a,b\n") :]  # noqa
+
+
+@pytest.mark.parametrize(
+    "extension,compress,compression",
+    [
+        (".csv.gz", gzip.compress, "GZIP"),
+        (".csv.bz2", bz2.compress, "BZIP2"),
+    ],
+)
+def test_forwarded_source(tmp_path, extension, compress, compression):
+    path = tmp_path / f"source{extension}"
+    path.write_bytes(compress(text.encode("utf-8")))
+    source = local_utilities.load_source(str(path), upload_options)
+    assert source.fieldnames == ["a", "b"]
+    assert source.compression == compression
+    assert not source.is_empty()
+    chunks, chunk_count = local_utilities.chunkify(source, upload_options)
+    assert chunk_count == 1
+    assert list(chunks) == [
+        (0, constants.LocalFile(str(path)))
+    ]  # uploaded from the file, so it's never read into memory
+
+
+@pytest.mark.parametrize(
+    "name,options,expected",
+    [
+        ("source.csv", upload_options, True),
+        ("source.csv", {**upload_options, "load_in_parallel": 4}, False),
+        ("source.csv.gz", upload_options, False),
+        ("source.csv.gz", {**upload_options, "raw_passthrough": False}, True),
+    ],
+)
+def test_sizes_chunks(tmp_path, name, options, expected):
+    path = tmp_path / name
+    data = text.encode("utf-8")
+    path.write_bytes(gzip.compress(data) if name.endswith(".gz") else data)
+    source = local_utilities.load_source(str(path), options)
+    assert local_utilities.sizes_chunks(source, options) is expected
+
+
+if __name__ == "__main__":
+    import pathlib
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        test_forwarded_source(pathlib.Path(tmp), ".csv.gz", gzip.compress, "GZIP")
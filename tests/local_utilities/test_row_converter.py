@@ -0,0 +1,28 @@
+from redshift_upload import local_utilities  # noqa
+import pytest  # noqa
+
+integer = local_utilities.integer_converter
+boolean = local_utilities.boolean_converter
+identity = local_utilities.no_conversion
+
+
+@pytest.mark.parametrize(
+    "conversions,row",
+    [
+        ([identity, integer, boolean], ["a", "1.0", "true"]),
+        ([identity, integer, boolean], ["a", "", ""]),
+        ([identity, integer, boolean], ["a", "2"]),  # short rows are filled in by COPY
+        ([identity, integer, boolean], ["a", "2", "0", "extra"]),
+        ([identity, integer, boolean], []),
+        ([identity, identity], ["a", "b"]),
+        ([identity, identity], ["a", "b", "c"]),
+        ([], ["a"]),
+    ],
+)
+def test_row_converter(conversions, row):
+    expected = [func(x) for func, x in zip(conversions, row)]
+    assert local_utilities.row_converter(conversions)(list(row)) == expected
+
+
+if __name__ == "__main__":
+    test_row_converter([identity, integer, boolean], ["a", "1.0", "true"])
@@ -0,0 +1,74 @@
+from redshift_upload import local_utilities, constants  # noqa
+from redshift_upload.db_interfaces import dummy  # noqa
+import bz2
+import csv
+import io
+import random
+import pytest  # noqa
+
+sample_options = {**constants.UPLOAD_DEFAULTS, "infer_sample_rows": 10}
+
+
+def make_rows(last):
+    return [{"a": f"{i % 100}.0", "b": "x"} for i in range(5000)] + [last]
+
+
+def load(rows, upload_options):
+    random.seed(0)
+    source = local_utilities.load_source(rows)
+    local_utilities.fix_column_types(source, dummy.Interface(), False, upload_options)
+    return source
+
+
+def decompress(chunks):
+    by_index = dict(chunks)  # a rewritten chunk replaces the original
+    ret = []
+    for i in sorted(by_index):
+        ret.extend(csv.reader(io.StringIO(bz2.decompress(by_index[i]).decode("utf-8"))))
+    return ret
+
+
+def test_sample_small_source():
+    source = load(make_rows({"a": "1", "b": "x"})[-10:], sample_options)
+    assert source.unvalidated is None
+    assert source.num_rows == 10
+
+
+def test_sample_widened():
+    rows = make_rows({"a": "1.5", "b": "y" * 300})
+    source = load(rows, sample_options)
+    assert source.unvalidated is not None
+    # the sample misses the last row
+    assert source.column_types["a"]["type"] == "SMALLINT"
+
+    chunks, _ = local_utilities.chunkify(
+        source, {**sample_options, "load_in_parallel": 4}
+    )
+    chunks = list(chunks)
+    assert len(chunks) > 4  # the chunks written before the widening are rewritten
+    assert source.column_types["a"]["type"] == "DOUBLE PRECISION"
+    assert source.column_types["b"]["suffix"] == 300
+    assert source.num_rows == len(rows)
+    assert decompress(chunks) == [[row["a"], row["b"]] for row in rows]
+
+    expected = load(rows, constants.UPLOAD_DEFAULTS)
+    for col in "ab":
+        assert source.column_types[col]["type"] == expected.column_types[col]["type"]
+
+
+def test_sample_not_viable(caplog):
+    source = local_utilities.load_source(make_rows({"a": "a", "b": "x"}))
+    source.predefined_columns = {"a": {"type": "SMALLINT", "suffix": None}}
+    random.seed(0)
+    local_utilities.fix_column_types(source, dummy.Interface(), False, sample_options)
+    chunks, _ = local_utilities.chunkify(source, sample_options)
+    with pytest.raises(ValueError):
+        list(chunks)
+    assert (
+        "The improper values are: a" in caplog.text
+    )  # the bad values are shown, like they are after a full scan
+    assert "The improper rows are: 5000" in caplog.text
+
+
+if __name__ == "__main__":
+    test_sample_widened()
@@ -0,0 +1,182 @@
+"""
+Microbenchmark of the type classifiers in redshift_upload.type_classifiers against the strptime/try-except versions they replaced.
+Run with: python ./tests/performance/classifier_speed.py
+"""
+
+import datetime
+import sys
+import pathlib
+import timeit
+import pandas
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[2]))
+from redshift_upload import type_classifiers  # noqa
+
+NUMBER = 20_000
+REPEAT = 5
+
+
+def legacy_date_func(x, _):
+    if x == "":
+        return True
+    try:
+        datetime.datetime.strptime(x, "%Y-%m-%d")
+        return True
+    except:  # noqa
+        return False
+
+
+def legacy_timestamptz_func(x, _):
+    if x == "":
+        return True
+    for fmt in ("%Y-%m-%d %H:%M:%S%z", "%Y-%m-%d %H:%M:%S%f%z", "%Y-%m-%d %H:%M%z"):
+        try:
+            datetime.datetime.strptime(x, fmt)
+            return True
+        except:  # noqa
+            pass
+    return False
+
+
+def legacy_timestamp_func(x, _):
+    if x == "":
+        return True
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M:%S%f", "%Y-%m-%d %H:%M"):
+        try:
+            datetime.datetime.strptime(x, fmt)
+            return True
+        except:  # noqa
+            pass
+    return False
+
+
+def legacy_int_range_func(low, high):
+    def func(x, _):
+        if x == "":
+            return True
+        x = x.rstrip("0").rstrip(".")
+        try:
+            y = int(x)
+            assert low <= y <= high
+            return True
+        except:  # noqa
+            return False
+
+    return func
+
+
+def legacy_double_precision_func(x, _):
+    if x == "":
+        return True
+    try:
+        float(x)
+        return True
+    except:  # noqa
+        return False
+
+
+def legacy_timetz_func(x, _):
+    if x == "":
+        return True
+    try:
+        datetime.datetime.strptime(x, "%H:%M:%S%z")
+        return True
+    except:  # noqa
+        return False
+
+
+def legacy_time_func(x, _):
+    if x == "":
+        return True
+    try:
+        datetime.datetime.strptime(x, "%H:%M:%S")
+        return True
+    except:  # noqa
+        return False
+
+
+CASES = [  # (type, legacy func, new func, a conforming value, a non-conforming value)
+    ("DATE", legacy_date_func, type_classifiers.date_func, "2021-06-15", "hello"),
+    (
+        "TIMESTAMPTZ",
+        legacy_timestamptz_func,
+        type_classifiers.timestamptz_func,
+        "2021-06-15 12:30:00+0000",
+        "2021-06-15 12:30:00",
+    ),
+    (
+        "TIMESTAMP",
+        legacy_timestamp_func,
+        type_classifiers.timestamp_func,
+        "2021-06-15 12:30:00",
+        "2021-06-15",
+    ),
+    (
+        "SMALLINT",
+        legacy_int_range_func(-32768, 32767),
+        type_classifiers.smallint_func,
+        "1234",
+        "12.5",
+    ),
+    (
+        "INTEGER",
+        legacy_int_range_func(-2147483648, 2147483647),
+        type_classifiers.int_func,
+        "123456",
+        "abc",
+    ),
+    (
+        "BIGINT",
+        legacy_int_range_func(-9223372036854775808, 9223372036854775807),
+        type_classifiers.bigint_func,
+        "12345678901",
+        "2021-06-15",
+    ),
+    (
+        "DOUBLE PRECISION",
+        legacy_double_precision_func,
+        type_classifiers.double_precision_func,
+        "1234.5678",
+        "abc",
+    ),
+    (
+        "TIMETZ",
+        legacy_timetz_func,
+        type_classifiers.timetz_func,
+        "12:30:00+0100",
+        "12:30:00",
+    ),
+    ("TIME", legacy_time_func, type_classifiers.time_func, "12:30:00", "1234"),
+]
+
+
+def per_value(func, value):
+    """Microseconds per call, taking the best of a few runs to cut down on noise"""
+    return (
+        min(timeit.repeat(lambda: func(value, None), number=NUMBER, repeat=REPEAT))
+        / NUMBER
+        * 1e6
+    )
+
+
+def main():
+    results = []
+    for typ, legacy, new, good, bad in CASES:
+        for kind, value in [("conforming", good), ("non-conforming", bad)]:
+            assert legacy(value, None) == new(value, None), (typ, value)
+            legacy_time = per_value(legacy, value)
+            new_time = per_value(new, value)
+            results.append(
+                {
+                    "type": typ,
+                    "value": kind,
+                    "legacy (us)": round(legacy_time, 3),
+                    "new (us)": round(new_time, 3),
+                    "speedup": f"{legacy_time / new_time:.1f}x",
+                }
+            )
+    print(pandas.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
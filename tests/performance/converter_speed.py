@@ -0,0 +1,133 @@
+"""
+Microbenchmarks of the row converter built by redshift_upload.local_utilities.row_converter against the per-cell conversion it replaced,
+on tables of increasing width where only a few columns need converting, and of the string-based integer converters against int(float(x)).
+Run with: python ./tests/performance/converter_speed.py
+"""
+
+import csv
+import io
+import sys
+import pathlib
+import time
+import timeit
+import pandas
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[2]))
+from redshift_upload import local_utilities  # noqa
+
+ROWS = 10_000
+NUMBER = 200_000
+REPEAT = 5
+WIDTHS = [10, 50, 200]
+CONVERTED_EVERY = 10  # one column in this many is an integer or a boolean
+
+
+def legacy_integer_converter(x):
+    return int(float(x)) if x != "" else None
+
+
+INTEGER_CASES = [  # (value, what the legacy converter loses)
+    ("12345", ""),
+    ("-12345", ""),
+    ("12345.0", ""),
+    ("", ""),
+    ("9007199254740993", "rounds to 9007199254740992"),
+    ("9223372036854775807", "rounds past the BIGINT range"),
+]
+
+
+def legacy_converter(conversions):
+    def convert(row):
+        return [func(x) for func, x in zip(conversions, row)]
+
+    return convert
+
+
+def schema(width):
+    conversions, row = [], []
+    for i in range(width):
+        if i % CONVERTED_EVERY == 0:
+            conversions.append(local_utilities.integer_converter)
+            row.append("12.0")
+        elif i % CONVERTED_EVERY == 1:
+            conversions.append(local_utilities.boolean_converter)
+            row.append("true")
+        else:
+            conversions.append(local_utilities.no_conversion)
+            row.append(f"text {i}")
+    return conversions, [list(row) for _ in range(ROWS)]
+
+
+def per_row(convert, rows):
+    """Microseconds per row, taking the best of a few runs to cut down on noise"""
+    times = []
+    for _ in range(REPEAT):
+        fresh = [list(row) for row in rows]  # row_converter converts in place
+        start = time.perf_counter()
+        list(map(convert, fresh))
+        times.append(time.perf_counter() - start)
+    return min(times) / len(rows) * 1e6
+
+
+def per_value(func, value):
+    """Microseconds per call, taking the best of a few runs to cut down on noise"""
+    return (
+        min(timeit.repeat(lambda: func(value), number=NUMBER, repeat=REPEAT))
+        / NUMBER
+        * 1e6
+    )
+
+
+def per_written(func, value):
+    """Like per_value, but the value is also written as CSV like write_chunk does, which is where an int has to be formatted again"""
+    writer = csv.writer(io.StringIO())
+    return per_value(lambda x: writer.writerow((func(x),)), value)
+
+
+def integer_results():
+    results = []
+    for value, note in INTEGER_CASES:
+        legacy = legacy_integer_converter(value)
+        new = local_utilities.bigint_converter(value)
+        assert (new is None) if legacy is None else int(new) == int(value.split(".")[0])
+        legacy_time = per_value(legacy_integer_converter, value)
+        new_time = per_value(local_utilities.bigint_converter, value)
+        legacy_written = per_written(legacy_integer_converter, value)
+        new_written = per_written(local_utilities.bigint_converter, value)
+        results.append(
+            {
+                "value": repr(value),
+                "legacy (us)": round(legacy_time, 3),
+                "new (us)": round(new_time, 3),
+                "speedup": f"{legacy_time / new_time:.1f}x",
+                "written speedup": f"{legacy_written / new_written:.1f}x",
+                "legacy loses": note,
+            }
+        )
+    return pandas.DataFrame(results)
+
+
+def main():
+    results = []
+    for width in WIDTHS:
+        conversions, rows = schema(width)
+        legacy = legacy_converter(conversions)
+        new = local_utilities.row_converter(conversions)
+        assert list(map(legacy, rows)) == list(map(new, [list(row) for row in rows]))
+        legacy_time = per_row(legacy, rows)
+        new_time = per_row(new, rows)
+        results.append(
+            {
+                "columns": width,
+                "legacy (us/row)": round(legacy_time, 2),
+                "new (us/row)": round(new_time, 2),
+                "speedup": f"{legacy_time / new_time:.1f}x",
+            }
+        )
+    print(pandas.DataFrame(results).to_string(index=False))
+    print()
+    print(integer_results().to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Benchmark of the per-chunk S3 upload in redshift_upload.db_interfaces.redshift.Interface.load_to_s3 against the delete/wait/put/wait
+sequence it replaced, and of the threads backend against the asyncio one (load_to_s3_async) on many small chunks.
+The uploads go to a local S3 stand-in that adds a fixed latency to every request, like the round trip to a real bucket.
+The asyncio backend needs aiobotocore, and is left out without it.
+Run with: python ./tests/performance/s3_upload_speed.py
+"""
+
+import asyncio
+import hashlib
+import http.server
+import sys
+import pathlib
+import threading
+import time
+import boto3
+import botocore.config
+import pandas
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[2]))
+from redshift_upload.db_interfaces import redshift  # noqa
+
+CHUNKS = 10
+CHUNK_SIZE = 256 * 1024
+LATENCIES = [0.005, 0.02, 0.05]  # seconds added to each request
+BACKEND_CASES = [
+    (100, 0.05),
+    (400, 0.05),
+    (400, 0.0),
+]  # (chunks, latency). Without latency, the time is all per-request overhead
+
+
+class StandIn(http.server.BaseHTTPRequestHandler):
+    """Just enough of S3 for a put, delete, and head of an object"""
+
+    protocol_version = "HTTP/1.1"  # botocore waits for a 100 Continue before sending a body, and keeps connections alive
+    objects = {}
+    latency = 0.0
+    requests = 0
+
+    def respond(self, status, headers=None):
+        StandIn.requests += 1
+        time.sleep(self.latency)
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.objects[self.path] = body
+        self.respond(200, {"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+
+    def do_DELETE(self):
+        self.objects.pop(self.path, None)
+        self.respond(204)
+
+    def do_HEAD(self):
+        self.respond(200 if self.path in self.objects else 404)
+
+    def log_message(self, *args):
+        pass
+
+
+def legacy_loader(interface, i, chunk):
+    obj = interface.get_s3_conn().Object(
+        interface.aws_info["constants"]["bucket"], interface.s3_name + str(i)
+    )
+    obj.delete()
+    obj.wait_until_not_exists()
+    response = obj.put(Body=chunk)
+    assert response["ResponseMetadata"]["HTTPStatusCode"] == 200
+    obj.wait_until_exists()
+
+
+def new_loader(interface, i, chunk):
+    interface.load_to_s3(iter([(i, chunk)]))
+
+
+def skip_manifest():
+    pass  # the manifest is written once per upload, not once per chunk, so it's left out of the per chunk times
+
+
+def interface(port):
+    ret = redshift.Interface.__new__(redshift.Interface)
+    ret.s3_name = "benchmark_"
+    ret.aws_info = {
+        "constants": {"bucket": "bucket"},
+        "s3": {"access_key": "dummy", "secret_key": "dummy"},
+    }
+    ret.s3_chunks = {}
+    ret.write_manifest = skip_manifest
+    ret._s3_conn = boto3.resource(
+        "s3",
+        aws_access_key_id="dummy",
+        aws_secret_access_key="dummy",
+        endpoint_url=f"http://127.0.0.1:{port}",
+        region_name="us-east-1",
+        config=botocore.config.Config(
+            s3={"addressing_style": "path"},
+            max_pool_connections=redshift.constants.S3_POOL_CONNECTIONS,
+        ),
+    )
+    args = ret.s3_client_args()
+    ret.s3_client_args = lambda: {**args, "endpoint_url": f"http://127.0.0.1:{port}"}
+    return ret
+
+
+def per_chunk(loader, target, chunk):
+    """Milliseconds and requests per chunk, uploading the chunks one after another"""
+    StandIn.requests = 0
+    start = time.perf_counter()
+    for i in range(CHUNKS):
+        loader(target, i, chunk)
+    return (time.perf_counter() - start) / CHUNKS * 1000, StandIn.requests / CHUNKS
+
+
+def main():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    target = interface(server.server_address[1])
+    chunk = bytes(range(256)) * (CHUNK_SIZE // 256)
+    redshift.log.disabled = True
+    results = []
+    for latency in LATENCIES:
+        StandIn.latency = latency
+        legacy_time, legacy_requests = per_chunk(legacy_loader, target, chunk)
+        new_time, new_requests = per_chunk(new_loader, target, chunk)
+        results.append(
+            {
+                "latency (ms)": latency * 1000,
+                "legacy (ms/chunk)": round(legacy_time, 1),
+                "new (ms/chunk)": round(new_time, 1),
+                "saved (ms/chunk)": round(legacy_time - new_time, 1),
+                "legacy requests": legacy_requests,
+                "new requests": new_requests,
+            }
+        )
+    print(pandas.DataFrame(results).to_string(index=False))
+    print()
+    print(backend_results(target, chunk[:1024]).to_string(index=False))
+    server.shutdown()
+
+
+def backend_results(target, chunk):
+    """Seconds to upload many small chunks, which is bound by how many requests are in flight at once"""
+    if redshift.aiobotocore_missing():
+        print("aiobotocore isn't installed, so only the threads backend is timed")
+    results = []
+    for count, latency in BACKEND_CASES:
+        StandIn.latency = latency
+        chunks = [(i, chunk) for i in range(count)]
+        start = time.perf_counter()
+        target.load_to_s3(iter(chunks))
+        row = {
+            "chunks": count,
+            "latency (ms)": latency * 1000,
+            "threads (s)": round(time.perf_counter() - start, 2),
+        }
+        if not redshift.aiobotocore_missing():
+            start = time.perf_counter()
+            asyncio.run(target.load_to_s3_async(iter(chunks), queue_size=count))
+            row["asyncio (s)"] = round(time.perf_counter() - start, 2)
+        results.append(row)
+    return pandas.DataFrame(results)
+
+
+if __name__ == "__main__":
+    main()
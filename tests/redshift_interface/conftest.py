@@ -0,0 +1,115 @@
+from redshift_upload.db_interfaces import redshift  # noqa
+import hashlib
+import http.server
+import threading
+import urllib.parse
+import pytest  # noqa
+
+
+class StandIn(http.server.BaseHTTPRequestHandler):
+    """
+    Just enough of S3 for puts and multipart uploads, so a real S3 connection can be pointed at it.
+    The parts in failing fail on their first attempt. Anything but an upload (like a delete or a head) is unexpected
+    """
+
+    protocol_version = "HTTP/1.1"  # botocore waits for a 100 Continue before sending a body, and keeps connections alive
+    lock = threading.Lock()
+
+    @classmethod
+    def reset(cls):
+        cls.objects = {}
+        cls.uploads = {}
+        cls.aborted = []
+        cls.attempts = {}
+        cls.failing = set()
+        cls.broken = False  # every part fails
+
+    def respond(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def parse(self):
+        url = urllib.parse.urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        return (
+            url.path.rsplit("/", 1)[-1],
+            urllib.parse.parse_qs(url.query, keep_blank_values=True),
+            body,
+        )
+
+    def do_PUT(self):
+        key, query, body = self.parse()
+        etag = {"ETag": f'"{hashlib.md5(body).hexdigest()}"'}
+        with self.lock:
+            if "partNumber" not in query:
+                self.objects[key] = body
+                failed = False
+            else:
+                number = int(query["partNumber"][0])
+                attempt = self.attempts[number] = self.attempts.get(number, 0) + 1
+                failed = self.broken or (number in self.failing and attempt == 1)
+                if not failed:
+                    self.uploads[query["uploadId"][0]][number] = body
+        if failed:
+            return self.respond(500)
+        self.respond(200, headers=etag)
+
+    def do_POST(self):
+        key, query, _ = self.parse()
+        with self.lock:
+            if "uploads" not in query:
+                parts = self.uploads.pop(query["uploadId"][0])
+                self.objects[key] = b"".join(parts[i] for i in sorted(parts))
+                upload_id = None
+            else:
+                upload_id = f"upload{len(self.uploads) + len(self.aborted)}"
+                self.uploads[upload_id] = {}
+        if upload_id is None:
+            return self.respond(
+                200, b"<CompleteMultipartUploadResult></CompleteMultipartUploadResult>"
+            )
+        self.respond(
+            200,
+            f"<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>".encode(),
+        )
+
+    def do_DELETE(self):
+        key, query, _ = self.parse()
+        with self.lock:
+            self.uploads.pop(query["uploadId"][0])
+            self.aborted.append(key)
+        self.respond(204)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def interface():
+    """An Interface that never connects to Redshift. Unless the test sets one, its S3 connection is made on first use"""
+    ret = redshift.Interface.__new__(redshift.Interface)
+    ret.s3_name = "test_"
+    ret.aws_info = {
+        "constants": {"bucket": "bucket"},
+        "s3": {"access_key": "dummy", "secret_key": "dummy"},
+    }
+    ret._s3_conn = None
+    ret.s3_chunks = {}
+    return ret
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    """Serves a fresh StandIn, which every S3 connection made during the test is sent to"""
+    StandIn.reset()
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv(
+        "AWS_ENDPOINT_URL", f"http://127.0.0.1:{server.server_address[1]}"
+    )
+    yield StandIn
+    server.shutdown()
@@ -0,0 +1,64 @@
+from redshift_upload import redshift_utilities, constants  # noqa
+import asyncio
+import json
+import pytest  # noqa
+
+pytest.importorskip("aiobotocore")
+MB = 1024 ** 2
+
+transfer_config = redshift_utilities.transfer_config(
+    {
+        **constants.UPLOAD_DEFAULTS,
+        "multipart_threshold": 6 * MB,
+        "multipart_chunksize": 5 * MB,
+    }
+)
+
+
+@pytest.mark.parametrize("queue_size", [None, 1, 50])
+def test_load_to_s3_async(stand_in, interface, queue_size):
+    stand_in.failing = {2}
+    chunks = [(i, f"chunk {i}".encode()) for i in range(100)]
+    chunks += [(100, bytes(range(256)) * (64 * 1024)), (3, b"rewritten")]  # 16MB
+    asyncio.run(interface.load_to_s3_async(iter(chunks), queue_size, transfer_config))
+    manifest = json.loads(stand_in.objects.pop("test_.manifest"))
+    expected = {f"test_{i}": chunk for i, chunk in chunks if i != 3}
+    expected["test_3"] = b"rewritten"
+    assert stand_in.objects == expected
+    assert stand_in.attempts == {
+        1: 1,
+        2: 2,
+        3: 1,
+        4: 1,
+    }  # only the failed part is resent
+    assert len(manifest["entries"]) == 101
+
+
+def test_local_file(stand_in, interface, tmp_path):
+    small, large = tmp_path / "small.csv.gz", tmp_path / "large.csv.gz"
+    small.write_bytes(b"compressed")
+    large.write_bytes(bytes(range(256)) * (48 * 1024))  # 12MB, so 3 parts
+    chunks = [
+        (0, constants.LocalFile(str(small))),
+        (1, constants.LocalFile(str(large))),
+    ]
+    asyncio.run(interface.load_to_s3_async(iter(chunks), None, transfer_config))
+    stand_in.objects.pop("test_.manifest")
+    assert stand_in.objects == {
+        "test_0": small.read_bytes(),
+        "test_1": large.read_bytes(),
+    }
+    assert interface.s3_chunks == {"test_0": 10, "test_1": 12 * MB}
+    assert small.exists() and large.exists()  # the user's files
+
+
+def test_abort(stand_in, interface):
+    stand_in.broken = True
+    with pytest.raises(Exception):
+        asyncio.run(
+            interface.load_to_s3_async(
+                iter([(0, b"a" * 12 * MB)]), None, transfer_config
+            )
+        )
+    assert stand_in.aborted == ["test_0"]
+    assert stand_in.uploads == {}
@@ -0,0 +1,101 @@
+from redshift_upload.db_interfaces import redshift  # noqa
+import threading
+import pytest  # noqa
+
+
+class FakeObject:
+    def __init__(self, bucket, key):
+        self.bucket = bucket
+        self.key = key
+
+    def put(self, Body):
+        if self.key in self.bucket.unwritable:
+            raise RuntimeError("Access Denied")
+        self.bucket.objects[self.key] = Body
+
+
+class FakeBucket:
+    def __init__(self, keys, undeletable=(), unwritable=()):
+        self.objects = {key: b"x" for key in keys}
+        self.undeletable = set(undeletable)
+        self.unwritable = set(unwritable)
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def delete_objects(self, Delete):
+        self.release.wait()
+        keys = [x["Key"] for x in Delete["Objects"]]
+        self.batches.append(len(keys))
+        errors = []
+        for key in keys:
+            if key in self.undeletable:
+                errors.append({"Key": key, "Message": "Access Denied"})
+            else:
+                self.objects.pop(key, None)
+        return {"Errors": errors}
+
+    def Object(self, key):
+        return FakeObject(self, key)
+
+
+class FakeConn:
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    def Bucket(self, name):
+        return self.bucket
+
+
+def connect(interface, bucket, count):
+    """Points the interface at the bucket, as if it uploaded count chunks to it"""
+    interface._s3_conn = FakeConn(bucket)
+    interface.s3_chunks = {f"test_{i}": 1 for i in range(count)}
+    return interface
+
+
+@pytest.mark.parametrize(
+    "count,batches", [(1, [2]), (999, [1000]), (2500, [1000, 1000, 501])]
+)  # the manifest is deleted along with the chunks
+def test_cleanup_s3(interface, count, batches):
+    bucket = FakeBucket([f"test_{i}" for i in range(count)] + ["test_.manifest"])
+    connect(interface, bucket, count).cleanup_s3()
+    assert bucket.batches == batches
+    assert bucket.objects == {}
+
+
+def test_undeletable(interface):
+    bucket = FakeBucket([f"test_{i}" for i in range(5)], undeletable=["test_3"])
+    connect(interface, bucket, 5).cleanup_s3()
+    assert bucket.objects == {"test_3": b""}  # overwritten instead
+
+
+def test_unwritable(interface, caplog):
+    bucket = FakeBucket(
+        [f"test_{i}" for i in range(5)], undeletable=["test_3"], unwritable=["test_3"]
+    )
+    connect(interface, bucket, 5).cleanup_s3()  # logs the failed overwrite
+    assert bucket.objects == {"test_3": b"x"}
+    assert "Could not overwrite test_3" in caplog.text
+
+
+def test_skipped_chunks(interface):
+    """Only the chunks that were uploaded are deleted"""
+    bucket = FakeBucket(["test_0", "test_2", "test_.manifest"])
+    connect(interface, bucket, 0).s3_chunks = {"test_0": 1, "test_2": 1}
+    interface.cleanup_s3()
+    assert bucket.batches == [3]
+    assert bucket.objects == {}
+
+
+def test_background(interface):
+    bucket = FakeBucket(f"test_{i}" for i in range(10))
+    bucket.release.clear()  # the deletes hang until released
+    target = connect(interface, bucket, 10)
+    target.cleanup_s3(background=True)  # returns without waiting for them
+    assert len(bucket.objects) == 10
+    assert redshift.pending_cleanups == {target.cleanup_thread}
+    bucket.release.set()
+    redshift.join_cleanups()  # what runs when the interpreter exits
+    assert bucket.objects == {}
+    assert redshift.pending_cleanups == set()
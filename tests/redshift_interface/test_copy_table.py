@@ -0,0 +1,25 @@
+import pytest  # noqa
+
+
+class FakeCursor:
+    def __init__(self):
+        self.queries = []
+
+    def execute(self, query):
+        self.queries.append(query)
+
+
+@pytest.mark.parametrize(
+    "compression,header_rows", [("BZIP2", 0), ("GZIP", 1), ("", 0)]
+)
+def test_copy_table(interface, compression, header_rows):
+    cursor = FakeCursor()
+    interface.full_table_name = "public.test"
+    interface.copy_table(cursor, ['"a"', '"b"'], compression, header_rows)
+    (query,) = cursor.queries
+    lines = [line.strip() for line in query.splitlines()]
+    assert lines[0] == 'copy public.test ("a", "b")'
+    assert lines[1] == "from 's3://bucket/test_.manifest'"  # never the bare prefix
+    assert "manifest" in lines
+    assert ("IGNOREHEADER 1" in lines) == bool(header_rows)
+    assert lines[-1] == compression
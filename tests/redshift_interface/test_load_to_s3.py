@@ -0,0 +1,135 @@
+from redshift_upload import constants  # noqa
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import pytest  # noqa
+
+
+class FakeObject:
+    def __init__(self, bucket, key):
+        self.bucket = bucket
+        self.key = key
+
+    def put(self, Body, ContentMD5=None):
+        self.bucket.release.wait()
+        if Body == b"fail":
+            raise ValueError("failed upload")
+        if ContentMD5 is not None:
+            assert base64.b64decode(ContentMD5) == hashlib.md5(Body).digest()
+        self.bucket.objects[self.key] = Body
+        stored = self.bucket.corrupt.get(self.key, Body)
+        return {
+            "ResponseMetadata": {"HTTPStatusCode": 200},
+            "ETag": f'"{hashlib.md5(stored).hexdigest()}"',
+        }
+
+    def upload_file(self, Filename, Config=None):
+        self.bucket.release.wait()
+        with open(Filename, "rb") as f:
+            self.bucket.objects[self.key] = f.read()
+        self.bucket.files.append(self.key)
+
+
+class FakeBucket:
+    def __init__(self):
+        self.objects = {}
+        self.files = []
+        self.corrupt = {}  # keys whose ETag comes back for other data
+        self.release = threading.Event()
+        self.release.set()
+
+    def Object(self, bucket, key):
+        return FakeObject(self, key)
+
+
+@pytest.fixture
+def bucket(interface):
+    ret = FakeBucket()
+    interface._s3_conn = ret
+    return ret
+
+
+def test_load_to_s3(interface, bucket):
+    chunks = [(i, f"chunk {i}".encode()) for i in range(30)] + [(3, b"rewritten")]
+    interface.load_to_s3(iter(chunks))
+    manifest = json.loads(bucket.objects.pop("test_.manifest"))
+    expected = {f"test_{i}": f"chunk {i}".encode() for i in range(30)}
+    expected["test_3"] = b"rewritten"
+    assert bucket.objects == expected
+    assert manifest["entries"] == [
+        {
+            "url": f"s3://bucket/{key}",
+            "mandatory": True,
+            "meta": {"content_length": len(chunk)},
+        }
+        for key, chunk in expected.items()
+    ]
+
+
+@pytest.mark.parametrize("queue_size", [None, 1, 5])
+def test_backpressure(interface, bucket, queue_size):
+    produced = []
+
+    def chunks():
+        for i in range(100):
+            produced.append(i)
+            yield i, b"x"
+
+    bucket.release.clear()  # the uploads hang until released
+    loading = threading.Thread(target=interface.load_to_s3, args=(chunks(), queue_size))
+    loading.start()
+    loading.join(0.2)
+    held = (queue_size or constants.MAX_THREAD_COUNT) + constants.MAX_THREAD_COUNT
+    assert len(produced) <= held + 1  # the producer blocks with one chunk in hand
+    bucket.release.set()
+    loading.join()
+    assert len(bucket.objects) == 101  # with the manifest
+
+
+@pytest.mark.parametrize("memory_budget,spilled", [(10 ** 6, 0), (25, 37), (1, 40)])
+def test_memory_budget(
+    interface, bucket, monkeypatch, tmp_path, memory_budget, spilled
+):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    chunks = [(i, f"chunk {i:02}".encode()) for i in range(40)]
+    bucket.release.clear()  # nothing finishes uploading until every chunk is built
+    loading = threading.Thread(
+        target=interface.load_to_s3, args=(iter(chunks), None, memory_budget)
+    )
+    loading.start()
+    loading.join(0.2)
+    assert len(os.listdir(tmp_path)) == spilled  # 8 byte chunks, so 3 fit in 25 bytes
+    bucket.release.set()
+    loading.join()
+    bucket.objects.pop("test_.manifest")
+    assert bucket.objects == {f"test_{i}": chunk for i, chunk in chunks}
+    assert len(bucket.files) == spilled
+    assert (
+        os.listdir(tmp_path) == []
+    )  # each spilled chunk is deleted once it's uploaded
+
+
+def test_local_file(interface, bucket, tmp_path):
+    path = tmp_path / "source.csv.gz"
+    path.write_bytes(b"compressed")
+    chunks = [(0, constants.LocalFile(str(path))), (1, b"x")]
+    interface.load_to_s3(iter(chunks), None, 1)
+    bucket.objects.pop("test_.manifest")
+    assert bucket.objects == {"test_0": b"compressed", "test_1": b"x"}
+    assert interface.s3_chunks == {"test_0": 10, "test_1": 1}  # the file's size
+    assert path.exists()  # the user's file, not a spilled chunk
+
+
+def test_failure(interface, bucket):
+    chunks = [(i, b"fail" if i == 5 else b"x") for i in range(50)]
+    with pytest.raises(ValueError):
+        interface.load_to_s3(iter(chunks))
+
+
+def test_etag_mismatch(interface, bucket):
+    bucket.corrupt["test_1"] = b"something else"
+    with pytest.raises(ValueError):
+        interface.load_to_s3(iter([(i, b"x") for i in range(3)]))
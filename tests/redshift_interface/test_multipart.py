@@ -0,0 +1,41 @@
+from redshift_upload import redshift_utilities, constants  # noqa
+import pytest  # noqa
+
+MB = 1024 ** 2
+
+upload_options = {
+    **constants.UPLOAD_DEFAULTS,
+    "multipart_threshold": 6 * MB,
+    "multipart_chunksize": 5 * MB,
+}
+
+
+def test_multipart(monkeypatch, stand_in, interface):
+    monkeypatch.setattr("time.sleep", lambda x: None)  # the retries back off
+    stand_in.failing = {2}
+    chunks = [(0, b"a" * MB), (1, bytes(range(256)) * (64 * 1024))]  # 1MB, 16MB
+    interface.load_to_s3(
+        iter(chunks), None, None, redshift_utilities.transfer_config(upload_options)
+    )
+    stand_in.objects.pop("test_.manifest")
+    assert stand_in.objects == {f"test_{i}": chunk for i, chunk in chunks}
+    assert stand_in.attempts == {
+        1: 1,
+        2: 2,
+        3: 1,
+        4: 1,
+    }  # only the failed part is resent
+
+
+def test_abort(monkeypatch, stand_in, interface):
+    monkeypatch.setattr("time.sleep", lambda x: None)
+    stand_in.broken = True
+    with pytest.raises(BaseException):
+        interface.load_to_s3(
+            iter([(0, b"a" * 12 * MB)]),
+            None,
+            None,
+            redshift_utilities.transfer_config(upload_options),
+        )
+    assert stand_in.aborted == ["test_0"]
+    assert stand_in.uploads == {}
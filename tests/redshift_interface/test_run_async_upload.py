@@ -0,0 +1,42 @@
+from redshift_upload import constants, redshift_utilities  # noqa
+import asyncio
+import threading
+import pytest  # noqa
+
+
+class FakeInterface:
+    def __init__(self):
+        self.loaded = None
+        self.thread = None
+
+    async def load_to_s3_async(self, sources, queue_size=None, transfer_config=None):
+        await asyncio.sleep(0)
+        self.loaded = list(sources)
+        self.thread = threading.current_thread()
+
+
+def test_no_running_loop():
+    interface = FakeInterface()
+    redshift_utilities.run_async_upload(
+        interface, iter([(0, b"a")]), constants.UPLOAD_DEFAULTS
+    )
+    assert interface.loaded == [(0, b"a")]
+    assert interface.thread is threading.current_thread()
+
+
+def test_running_loop():
+    """Called from a coroutine, the upload can't use asyncio.run on this thread"""
+    interface = FakeInterface()
+
+    async def caller():
+        redshift_utilities.run_async_upload(
+            interface, iter([(0, b"a"), (1, b"b")]), constants.UPLOAD_DEFAULTS
+        )
+
+    asyncio.run(caller())
+    assert interface.loaded == [(0, b"a"), (1, b"b")]
+    assert interface.thread is not threading.current_thread()
+
+
+if __name__ == "__main__":
+    test_running_loop()
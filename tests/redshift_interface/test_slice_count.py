@@ -0,0 +1,62 @@
+from redshift_upload.db_interfaces import redshift  # noqa
+import psycopg2
+import pytest  # noqa
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query):
+        self.conn.queries.append(query)
+        if self.conn.slices is None:
+            raise psycopg2.ProgrammingError("permission denied for relation stv_slices")
+
+    def fetchone(self):
+        return (self.conn.slices,)
+
+
+class FakeConnection:
+    def __init__(self, slices):
+        self.slices = slices
+        self.queries = []
+        self.rolled_back = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+def connect(interface, host, conn):
+    interface.aws_info["db"] = {"host": host}
+    interface.get_db_conn = lambda: conn
+
+
+def test_slice_count(interface, monkeypatch):
+    monkeypatch.setattr(redshift, "slice_counts", {})
+    conn = FakeConnection(8)
+    connect(interface, "a", conn)
+    assert interface.get_slice_count() == 8
+    assert interface.get_slice_count() == 8
+    assert len(conn.queries) == 1  # cached per host
+    connect(interface, "b", FakeConnection(4))
+    assert interface.get_slice_count() == 4
+
+
+def test_unreadable_slice_count(interface, monkeypatch):
+    monkeypatch.setattr(redshift, "slice_counts", {})
+    conn = FakeConnection(None)
+    connect(interface, "a", conn)
+    assert interface.get_slice_count() == 1
+    assert conn.rolled_back
+    assert redshift.slice_counts == {}  # a later upload can still read it
+    connect(interface, "a", FakeConnection(8))
+    assert interface.get_slice_count() == 8